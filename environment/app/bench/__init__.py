@@ -0,0 +1 @@
+"""Benchmarks for the Environment API, run against a live database."""
@@ -0,0 +1,94 @@
+"""
+Benchmark grading throughput of task_service.submit_answer.
+
+Compares the previous SELECT + ORM mutation + COMMIT grading path with the
+single conditional UPDATE ... RETURNING statement. Run it from the app
+directory wherever DATABASE_URL reaches Postgres (e.g. the API container):
+
+    python -m bench.submit --tasks 5000 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import datetime
+from uuid import UUID
+
+from db import Task, async_session
+from services import task_service
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+BENCH_SEED = -3
+
+
+async def legacy_submit_answer(
+    db: AsyncSession, task_id: UUID, answer: int
+) -> tuple[bool, float, int]:
+    """Grading path as it was before the conditional UPDATE."""
+    result = await db.execute(select(Task).where(Task.id == task_id))
+    task = result.scalar_one_or_none()
+    if task is None:
+        raise ValueError(f"Task {task_id} not found")
+
+    correct = answer == task.correct_answer
+    task.submitted_answer = answer
+    task.status = "completed" if correct else "failed"
+    task.solved_at = datetime.utcnow()
+    await db.commit()
+    return correct, task.reward if correct else 0.0, task.correct_answer
+
+
+async def seed_tasks(count: int) -> list[tuple[UUID, int]]:
+    """Create ``count`` benchmark tasks and return (id, correct_answer) pairs."""
+    async with async_session() as db:
+        await task_service.generate_tasks(db, BENCH_SEED, count)
+        result = await db.execute(
+            select(Task.id, Task.correct_answer).where(
+                Task.seed == BENCH_SEED, Task.status == "pending"
+            )
+        )
+        return [tuple(row) for row in result.all()]
+
+
+async def drop_tasks() -> None:
+    async with async_session() as db:
+        await db.execute(delete(Task).where(Task.seed == BENCH_SEED))
+        await db.commit()
+
+
+async def measure(submit, tasks: list[tuple[UUID, int]], concurrency: int) -> float:
+    """Submit every task through ``submit`` and return submits per second."""
+    queue = list(tasks)
+
+    async def worker():
+        async with async_session() as db:
+            while queue:
+                task_id, answer = queue.pop()
+                await submit(db, task_id, answer)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return len(tasks) / (time.perf_counter() - started)
+
+
+async def main(count: int, concurrency: int) -> None:
+    await drop_tasks()
+    try:
+        for name, submit in (
+            ("select+commit", legacy_submit_answer),
+            ("update-returning", task_service.submit_answer),
+        ):
+            tasks = await seed_tasks(count)
+            rate = await measure(submit, tasks, concurrency)
+            print(f"{name:>18}: {rate:9.1f} submits/sec")
+    finally:
+        await drop_tasks()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tasks", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(main(args.tasks, args.concurrency))
@@ -0,0 +1,93 @@
+"""
+Benchmark tasks/sec over one connection: REST polling vs WebSocket session.
+
+The REST path leases with GET /tasks/next and answers with POST
+/tasks/{id}/submit over a single keep-alive connection. The WebSocket path
+answers every pushed task immediately on /ws/session/{id}, letting the
+server pipeline grading. Run against a development environment whose task
+pool can be consumed (python -m bench.ws_session --url http://localhost:8000).
+"""
+
+import argparse
+import asyncio
+import http.client
+import json
+import time
+from urllib.parse import urlsplit
+
+import websockets
+from db import Task, async_session
+from sqlalchemy import delete
+
+BENCH_SEED = -10
+
+
+def rest_rate(url: str, count: int) -> float:
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port)
+    headers = {"Content-Type": "application/json"}
+
+    def call(method: str, path: str, body: dict | None = None):
+        conn.request(method, path, json.dumps(body) if body else None, headers)
+        return json.loads(conn.getresponse().read())
+
+    started = time.perf_counter()
+    for _ in range(count):
+        task = call("GET", "/tasks/next?individual_id=bench-rest")
+        answer = task["operand_a"] + task["operand_b"]
+        call("POST", f"/tasks/{task['id']}/submit", {"answer": answer})
+    elapsed = time.perf_counter() - started
+    conn.close()
+    return count / elapsed
+
+
+async def websocket_rate(url: str, count: int, window: int) -> float:
+    ws_url = url.replace("http", "ws", 1) + f"/ws/session/bench-ws?window={window}"
+    graded = 0
+    async with websockets.connect(ws_url) as ws:
+        started = time.perf_counter()
+        while graded < count:
+            message = json.loads(await ws.recv())
+            if message["type"] == "task":
+                task = message["task"]
+                answer = task["operand_a"] + task["operand_b"]
+                await ws.send(json.dumps({"task_id": task["id"], "answer": answer}))
+            elif message["type"] == "result":
+                graded += 1
+        return count / (time.perf_counter() - started)
+
+
+def generate(url: str, count: int) -> None:
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port)
+    body = json.dumps({"seed": BENCH_SEED, "count": count})
+    conn.request("POST", "/tasks/generate", body, {"Content-Type": "application/json"})
+    conn.getresponse().read()
+    conn.close()
+
+
+async def drop_tasks() -> None:
+    async with async_session() as db:
+        await db.execute(delete(Task).where(Task.seed == BENCH_SEED))
+        await db.commit()
+
+
+async def main(url: str, count: int, window: int) -> None:
+    # Headroom for tasks the session keeps in flight when it stops
+    generate(url, 2 * count + window)
+    try:
+        rate = await asyncio.to_thread(rest_rate, url, count)
+        print(f"{'rest next+submit':>18}: {rate:9.1f} tasks/sec")
+        rate = await websocket_rate(url, count, window)
+        print(f"{'websocket':>18}: {rate:9.1f} tasks/sec (window={window})")
+    finally:
+        await drop_tasks()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--tasks", type=int, default=1000)
+    parser.add_argument("--window", type=int, default=16)
+    args = parser.parse_args()
+    asyncio.run(main(args.url.rstrip("/"), args.tasks, args.window))
@@ -2,8 +2,17 @@ import os
 import uuid
 from datetime import datetime
 
-from sqlalchemy import Boolean, DateTime, Float, Integer, String
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    DateTime,
+    FetchedValue,
+    Float,
+    Integer,
+    SmallInteger,
+    String,
+)
+from sqlalchemy.dialects.postgresql import REAL, UUID
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
@@ -39,10 +48,33 @@ class Task(Base):
     submitted_answer: Mapped[int | None] = mapped_column(Integer, nullable=True)
     reward: Mapped[float] = mapped_column(Float, default=1.0)
     status: Mapped[str] = mapped_column(String(20), default="pending")
+    leased_by: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    lease_expires_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     solved_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
 
+class TaskCounter(Base):
+    """Striped per-status task counts, maintained by triggers on tasks."""
+
+    __tablename__ = "task_counters"
+
+    status: Mapped[str] = mapped_column(String(20), primary_key=True)
+    stripe: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    n: Mapped[int] = mapped_column(BigInteger, default=0)
+
+
+class TaskStream(Base):
+    """Stateless task stream: tasks of a seed are derived from their index."""
+
+    __tablename__ = "task_streams"
+
+    seed: Mapped[int] = mapped_column(Integer, primary_key=True)
+    total: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    next_index: Mapped[int] = mapped_column(BigInteger, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
 class Individual(Base):
     """Tracks registered individuals in the environment."""
 
@@ -57,3 +89,47 @@ class Individual(Base):
     age: Mapped[int] = mapped_column(Integer, default=0)
     tasks_solved: Mapped[int] = mapped_column(Integer, default=0)
     alive: Mapped[bool] = mapped_column(Boolean, default=True)
+    # energy and age are base values as of state_at; they decay lazily
+    state_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    energy_key: Mapped[float] = mapped_column(Float, default=0.0)
+    # Change version, assigned by a trigger on every insert and update
+    version: Mapped[int] = mapped_column(
+        BigInteger, server_default=FetchedValue(), server_onupdate=FetchedValue()
+    )
+    # Time and cause of the sacrifice; None while alive or after a revival
+    sacrificed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    cause: Mapped[str | None] = mapped_column(String(16), nullable=True)
+
+
+class HeartbeatSample(Base):
+    """Raw heartbeat history; the table is partitioned by day on ts."""
+
+    __tablename__ = "heartbeat_history"
+
+    # No key in the table; (individual_id, ts) only identifies rows for the ORM
+    individual_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    ts: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    energy: Mapped[float] = mapped_column(REAL)
+    age: Mapped[int] = mapped_column(Integer)
+    tasks_solved: Mapped[int] = mapped_column(Integer)
+
+
+class HeartbeatRollup:
+    """Columns of a downsampled heartbeat bucket."""
+
+    individual_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    bucket: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    samples: Mapped[int] = mapped_column(Integer)
+    energy_avg: Mapped[float] = mapped_column(REAL)
+    energy_min: Mapped[float] = mapped_column(REAL)
+    energy_max: Mapped[float] = mapped_column(REAL)
+    age: Mapped[int] = mapped_column(Integer)
+    tasks_solved: Mapped[int] = mapped_column(Integer)
+
+
+class HeartbeatRollup1m(HeartbeatRollup, Base):
+    __tablename__ = "heartbeat_rollup_1m"
+
+
+class HeartbeatRollup10m(HeartbeatRollup, Base):
+    __tablename__ = "heartbeat_rollup_10m"
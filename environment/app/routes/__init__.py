@@ -0,0 +1,5 @@
+"""API routers of the Environment app."""
+
+from routes import individuals, sacrifice, sessions, tasks
+
+__all__ = ["individuals", "sacrifice", "sessions", "tasks"]
@@ -0,0 +1,23 @@
+"""Weak ETags and If-None-Match handling for polled GET endpoints."""
+
+from fastapi import Request, Response
+
+
+def weak_etag(*parts: object) -> str:
+    """Weak ETag built from cheap version markers (counters, max versions)."""
+    return 'W/"' + "-".join(str(part) for part in parts) + '"'
+
+
+def not_modified(request: Request, etag: str) -> Response | None:
+    """
+    A 304 response if the request's If-None-Match matches ``etag``, else None.
+
+    Matching uses weak comparison (RFC 9110), so the W/ prefix is ignored.
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    if "*" in tags or etag.removeprefix("W/") in tags:
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
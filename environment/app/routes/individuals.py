@@ -0,0 +1,372 @@
+"""Individual routes: registration, heartbeats and lookups."""
+
+import json
+from collections.abc import AsyncIterator
+from datetime import datetime, timedelta, timezone
+
+from db import Individual, get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from schemas import (
+    HeartbeatHistoryPoint,
+    HeartbeatHistoryResponse,
+    IndividualChangesResponse,
+    IndividualHeartbeatBatchRequest,
+    IndividualHeartbeatBatchResponse,
+    IndividualHeartbeatRequest,
+    IndividualRegisterBatchRequest,
+    IndividualRegisterRequest,
+    IndividualResponse,
+    IndividualsListResponse,
+    RegistryStatsResponse,
+    StaleIndividual,
+    StaleIndividualsResponse,
+)
+from services import heartbeat_history, individual_service
+from sqlalchemy.ext.asyncio import AsyncSession
+from state import population, staleness
+from state.population import IndividualRecord
+
+from routes.conditional import not_modified, weak_etag
+
+router = APIRouter(tags=["individuals"])
+
+# Rows encoded per chunk written to a streamed listing
+LIST_CHUNK_ROWS = 100
+
+
+def naive_utc(ts: datetime) -> datetime:
+    """Timestamps are stored as naive UTC."""
+    if ts.tzinfo is None:
+        return ts
+    return ts.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def individual_to_response(
+    individual: Individual | IndividualRecord,
+) -> IndividualResponse:
+    """
+    Convert Individual model to response, formatting datetime fields.
+    Energy and age are reported as currently decayed.
+    """
+    energy, age = individual_service.decayed(individual, datetime.utcnow())
+    return IndividualResponse(
+        id=individual.id,
+        name=individual.name,
+        body_url=individual.body_url,
+        registered_at=individual.registered_at.isoformat(),
+        last_heartbeat=individual.last_heartbeat.isoformat(),
+        energy=energy,
+        age=age,
+        tasks_solved=individual.tasks_solved,
+        alive=individual.alive,
+    )
+
+
+@router.post("/individuals/register", response_model=IndividualResponse)
+async def register_individual(
+    request: IndividualRegisterRequest,
+    db: AsyncSession = Depends(get_db),
+):
+    """Register a new individual with the environment."""
+    individual = await individual_service.register_individual(
+        db, request.id, request.name, request.body_url
+    )
+    (record,) = population.registry.store([individual])
+    return individual_to_response(record)
+
+
+@router.post("/individuals/register_batch", response_model=IndividualsListResponse)
+async def register_individuals(
+    request: IndividualRegisterBatchRequest,
+    db: AsyncSession = Depends(get_db),
+):
+    """Register (or revive) many individuals in one upsert statement."""
+    individuals = await individual_service.register_individuals(
+        db, [(i.id, i.name, i.body_url) for i in request.individuals]
+    )
+    records = population.registry.store(individuals)
+    return IndividualsListResponse(
+        individuals=[individual_to_response(r) for r in records]
+    )
+
+
+@router.post("/individuals/{individual_id}/heartbeat", response_model=IndividualResponse)
+async def individual_heartbeat(
+    individual_id: str,
+    request: IndividualHeartbeatRequest,
+):
+    """
+    Update individual's state from heartbeat.
+
+    The state is applied to the in-memory registry; the write is coalesced
+    with other heartbeats and flushed to the database within
+    HEARTBEAT_FLUSH_MS.
+    """
+    record = await population.registry.heartbeat(
+        individual_id,
+        request.energy,
+        request.age,
+        request.tasks_solved,
+        request.alive,
+    )
+    if record is None:
+        raise HTTPException(status_code=404, detail="Individual not found")
+    return individual_to_response(record)
+
+
+@router.post(
+    "/individuals/heartbeat_batch", response_model=IndividualHeartbeatBatchResponse
+)
+async def individual_heartbeat_batch(request: IndividualHeartbeatBatchRequest):
+    """
+    Apply heartbeats of many individuals (e.g. one host) at once.
+
+    Only ids that are not registered are returned, not full individuals.
+    """
+    unknown = await population.registry.apply_batch(
+        [
+            (beat.id, beat.energy, beat.age, beat.tasks_solved, beat.alive)
+            for beat in request.heartbeats
+        ],
+    )
+    return IndividualHeartbeatBatchResponse(
+        applied=len({beat.id for beat in request.heartbeats}) - len(unknown),
+        unknown=unknown,
+    )
+
+
+async def _individual_chunks(
+    fields: tuple[str, ...],
+    after: tuple[str, str] | None,
+    limit: int | None,
+    filters: dict,
+) -> AsyncIterator[str]:
+    """Encode a listing as JSON incrementally, LIST_CHUNK_ROWS rows per chunk."""
+    yield '{"individuals":['
+    chunk: list[str] = []
+    emitted = 0
+    last = None
+    next_cursor = None
+    decays = "energy" in fields or "age" in fields
+    for record in population.registry.iter_records(after, **filters):
+        if emitted == limit:
+            next_cursor = individual_service.encode_cursor(last.name, last.id)
+            break
+        row = {field: getattr(record, field) for field in fields}
+        if decays:
+            energy, age = individual_service.decayed(record, datetime.utcnow())
+            row.update((k, v) for k, v in (("energy", energy), ("age", age)) if k in row)
+        chunk.append(json.dumps(row, default=datetime.isoformat))
+        emitted += 1
+        last = record
+        if len(chunk) == LIST_CHUNK_ROWS:
+            yield ("," if emitted > len(chunk) else "") + ",".join(chunk)
+            chunk = []
+    if chunk:
+        yield ("," if emitted > len(chunk) else "") + ",".join(chunk)
+    yield f'],"next_cursor":{json.dumps(next_cursor)}}}'
+
+
+@router.get("/individuals", response_model=IndividualsListResponse)
+async def list_individuals(
+    request: Request,
+    limit: int | None = Query(None, ge=1, le=10000),
+    cursor: str | None = None,
+    fields: str | None = None,
+    alive: bool | None = None,
+    min_energy: float | None = None,
+    max_energy: float | None = None,
+    stale_since: datetime | None = None,
+):
+    """
+    List individuals ordered by (name, id), streamed as JSON.
+
+    With ``limit`` the page ends with a ``next_cursor`` to pass back as
+    ``cursor``; without it every match is streamed. ``fields`` is a
+    comma-separated projection (e.g. ``id,energy``), and ``stale_since``
+    keeps individuals whose last heartbeat is older than that time.
+
+    Served from the in-memory registry. The weak ETag is the registry's
+    revision and the decay time bucket, so a matching If-None-Match is
+    answered with 304 at once.
+    """
+    try:
+        projection = individual_service.parse_fields(fields)
+        after = individual_service.decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    registry = population.registry
+    etag = weak_etag(
+        "individuals",
+        registry.epoch,
+        registry.revision,
+        individual_service.decay_epoch(datetime.utcnow()),
+    )
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    if stale_since is not None:
+        stale_since = naive_utc(stale_since)
+    filters = {
+        "alive": alive,
+        "min_energy": min_energy,
+        "max_energy": max_energy,
+        "stale_since": stale_since,
+    }
+    return StreamingResponse(
+        _individual_chunks(projection, after, limit, filters),
+        media_type="application/json",
+        headers={"ETag": etag},
+    )
+
+
+@router.get("/individuals/changes", response_model=IndividualChangesResponse)
+async def individual_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(individual_service.CHANGES_LIMIT, ge=1, le=10000),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Individuals registered or updated since the ``since`` cursor.
+
+    Start from 0, then pass back the returned ``cursor``; poll again
+    immediately while ``has_more`` is true.
+    """
+    individuals, cursor, has_more = await individual_service.get_changes(
+        db, since, limit
+    )
+    return IndividualChangesResponse(
+        individuals=[individual_to_response(i) for i in individuals],
+        cursor=cursor,
+        has_more=has_more,
+    )
+
+
+@router.get("/individuals/stale", response_model=StaleIndividualsResponse)
+def get_stale_individuals():
+    """
+    Alive individuals whose heartbeat deadline has passed, longest stale first.
+
+    Read from the heartbeat deadline wheel, without scanning the population.
+    """
+    wheel = staleness.wheel
+    stale = sorted(wheel.stale().items(), key=lambda item: item[1])
+    individuals = []
+    for individual_id, deadline in stale:
+        record = population.registry.get(individual_id)
+        if record is None:
+            continue
+        individuals.append(
+            StaleIndividual(
+                id=record.id,
+                name=record.name,
+                last_heartbeat=record.last_heartbeat.isoformat(),
+                stale_since=datetime.utcfromtimestamp(deadline).isoformat(),
+            )
+        )
+    return StaleIndividualsResponse(
+        stale_after_seconds=wheel.stale_after,
+        tracked=len(wheel),
+        individuals=individuals,
+    )
+
+
+@router.get("/individuals/registry/stats", response_model=RegistryStatsResponse)
+def get_registry_stats():
+    """Get the size, write-behind and change-feed counters of the in-memory registry."""
+    registry = population.registry
+    stats = registry.stats
+    return RegistryStatsResponse(
+        individuals=len(registry),
+        dirty=registry.dirty,
+        revision=registry.revision,
+        flushes=stats.flushes,
+        flushed_total=stats.flushed_total,
+        flush_errors=stats.flush_errors,
+        history_recorded=stats.history_recorded,
+        history_dropped=stats.history_dropped,
+        change_cursor=registry.cursor,
+        followed_total=stats.followed_total,
+        follow_errors=stats.follow_errors,
+        loaded_at=stats.loaded_at.isoformat() if stats.loaded_at else None,
+        last_flush_at=stats.last_flush_at.isoformat() if stats.last_flush_at else None,
+    )
+
+
+@router.post("/individuals/registry/reload", response_model=RegistryStatsResponse)
+async def reload_registry():
+    """
+    Flush pending heartbeats and reload the registry from the database.
+
+    Recovery path after the individuals table was changed outside the API.
+    """
+    await population.registry.reload()
+    return get_registry_stats()
+
+
+@router.get(
+    "/individuals/{individual_id}/history", response_model=HeartbeatHistoryResponse
+)
+async def get_heartbeat_history(
+    individual_id: str,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    resolution: str = Query("auto", pattern="^(auto|raw|1m|10m)$"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Heartbeat history of an individual in [start, end), oldest first.
+
+    Defaults to the last hour. ``auto`` picks raw samples for short ranges
+    and 1 or 10 minute rollups (average, min and max energy) for longer ones.
+    """
+    if population.registry.get(individual_id) is None:
+        raise HTTPException(status_code=404, detail="Individual not found")
+    end = naive_utc(end) if end else datetime.utcnow()
+    start = naive_utc(start) if start else end - timedelta(hours=1)
+    if resolution == "auto":
+        resolution = heartbeat_history.pick_resolution(start, end)
+    points = await heartbeat_history.get_history(
+        db, individual_id, start, end, resolution
+    )
+    return HeartbeatHistoryResponse(
+        individual_id=individual_id,
+        resolution=resolution,
+        points=[
+            HeartbeatHistoryPoint(
+                ts=ts.isoformat(),
+                samples=samples,
+                energy=energy,
+                energy_min=energy_min,
+                energy_max=energy_max,
+                age=age,
+                tasks_solved=tasks_solved,
+            )
+            for ts, samples, energy, energy_min, energy_max, age, tasks_solved in points
+        ],
+    )
+
+
+@router.get("/individuals/{individual_id}", response_model=IndividualResponse)
+async def get_individual(individual_id: str, request: Request, response: Response):
+    """
+    Get a specific individual by ID from the in-memory registry.
+
+    The weak ETag is the record's revision and the decay time bucket; a
+    matching If-None-Match is answered with 304.
+    """
+    record = population.registry.get(individual_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Individual not found")
+    etag = weak_etag(
+        "individual",
+        population.registry.epoch,
+        record.revision,
+        individual_service.decay_epoch(datetime.utcnow()),
+    )
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    response.headers["ETag"] = etag
+    return individual_to_response(record)
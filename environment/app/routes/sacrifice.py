@@ -0,0 +1,185 @@
+"""Sacrifice/selection routes."""
+
+import hashlib
+from datetime import datetime
+
+from db import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from schemas import (
+    SacrificeCandidateResponse,
+    SacrificeCandidatesResponse,
+    SacrificeCheckRequest,
+    SacrificeCheckResponse,
+    SacrificedIndividualResponse,
+    SacrificeHistoryResponse,
+    SelectionRunResponse,
+    SelectionSchedulerStatsResponse,
+)
+from services import individual_service, sacrifice_service
+from sqlalchemy.ext.asyncio import AsyncSession
+from state import candidates, population, staleness
+from workers import selection_scheduler
+
+from routes.conditional import not_modified, weak_etag
+from routes.individuals import individual_to_response, naive_utc
+
+router = APIRouter(tags=["sacrifice"])
+
+
+@router.post("/sacrifice/check", response_model=SacrificeCheckResponse)
+async def check_sacrifice(
+    request: SacrificeCheckRequest = SacrificeCheckRequest(),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Manually trigger sacrifice check.
+
+    Sacrifices one individual if there are more than min_individuals alive.
+    Priority: stale individuals first, then lowest energy.
+
+    Batch mode (``count`` > 1 or ``fraction``) removes that many individuals
+    in one transaction, chosen by ``strategy``: truncation (the least fit),
+    tournament (least fit of random groups of ``tournament_size``) or
+    proportional (random, weighted towards the least fit).
+    """
+    # Decide on the persisted population and keep older flushes from
+    # reviving the victims
+    async with population.registry.synced():
+        victims = await sacrifice_service.sacrifice(
+            db,
+            request.strategy,
+            count=request.count,
+            fraction=request.fraction,
+            min_individuals=request.min_individuals,
+            stale_threshold_minutes=staleness.STALE_AFTER_SECONDS / 60,
+            seed=request.seed,
+            tournament_size=request.tournament_size,
+        )
+        for victim in victims:
+            population.registry.kill(victim)
+    if victims:
+        responses = [individual_to_response(victim) for victim in victims]
+        return SacrificeCheckResponse(
+            sacrificed=True, victim=responses[0], victims=responses
+        )
+    return SacrificeCheckResponse(
+        sacrificed=False,
+        reason="No eligible victims (not enough individuals or none qualified)",
+    )
+
+
+@router.get("/sacrifice/candidates", response_model=SacrificeCandidatesResponse)
+async def sacrifice_candidates(
+    limit: int = Query(10, ge=1, le=1000),
+    min_individuals: int = Query(2, ge=0),
+):
+    """
+    Get the next ``limit`` sacrifice candidates, next victim first: stale
+    individuals (longest silent first), then lowest current energy. The
+    ``min_individuals`` fittest are never candidates.
+
+    Read from the in-memory candidate heap in O(limit log n).
+    """
+    index = candidates.index
+    count = min(limit, len(index) - min_individuals)
+    ranked = []
+    for individual_id in index.bottom(count) if count > 0 else []:
+        record = population.registry.get(individual_id)
+        if record is not None:
+            ranked.append(
+                SacrificeCandidateResponse(
+                    **individual_to_response(record).model_dump(),
+                    stale=index.is_stale(individual_id),
+                )
+            )
+    return SacrificeCandidatesResponse(candidates=ranked, alive=len(index))
+
+
+@router.get("/sacrifice/history", response_model=SacrificeHistoryResponse)
+async def sacrifice_history(
+    request: Request,
+    response: Response,
+    limit: int = Query(sacrifice_service.HISTORY_LIMIT, ge=1, le=1000),
+    cursor: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Get sacrificed individuals, newest first, with time and cause of death.
+
+    Pages hold up to ``limit`` victims sacrificed in [start, end) when
+    given; pass ``next_cursor`` back as ``cursor`` for the next page. The
+    weak ETag digests the page's (id, version) pairs, so a matching
+    If-None-Match is answered with 304 before the rows are loaded.
+    """
+    try:
+        after = None
+        if cursor:
+            at, individual_id = individual_service.decode_cursor(cursor)
+            after = datetime.fromisoformat(at), individual_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    page, last = await sacrifice_service.get_sacrifice_history(
+        db,
+        limit,
+        after,
+        naive_utc(start) if start else None,
+        naive_utc(end) if end else None,
+    )
+    next_cursor = (
+        individual_service.encode_cursor(last[0].isoformat(), last[1]) if last else None
+    )
+    digest = hashlib.blake2b(digest_size=8)
+    for individual_id, version in page:
+        digest.update(f"{individual_id}:{version};".encode())
+    etag = weak_etag("history", len(page), next_cursor or "", digest.hexdigest())
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    victims = await sacrifice_service.get_victims(db, [i for i, _ in page])
+    response.headers["ETag"] = etag
+    return SacrificeHistoryResponse(
+        victims=[
+            SacrificedIndividualResponse(
+                **individual_to_response(victim).model_dump(),
+                sacrificed_at=victim.sacrificed_at.isoformat(),
+                cause=victim.cause,
+            )
+            for victim in victims
+        ],
+        next_cursor=next_cursor,
+    )
+
+
+@router.get(
+    "/sacrifice/scheduler/stats", response_model=SelectionSchedulerStatsResponse
+)
+def get_scheduler_stats():
+    """
+    Get leadership and per-run counters of the background selection
+    scheduler in this process, most recent run last.
+    """
+    stats = selection_scheduler.stats
+    return SelectionSchedulerStatsResponse(
+        enabled=selection_scheduler.enabled(),
+        leader=stats.leader,
+        elections=stats.elections,
+        interval_seconds=selection_scheduler.SELECTION_INTERVAL_SECONDS,
+        max_population=selection_scheduler.SELECTION_MAX_POPULATION,
+        strategy=selection_scheduler.SELECTION_STRATEGY,
+        runs=stats.runs,
+        errors=stats.errors,
+        victims_total=stats.victims_total,
+        duration_total_ms=round(stats.duration_total_ms, 3),
+        last_run_at=stats.last_run_at.isoformat() if stats.last_run_at else None,
+        recent_runs=[
+            SelectionRunResponse(
+                started_at=run.started_at.isoformat(),
+                trigger=run.trigger,
+                duration_ms=round(run.duration_ms, 3),
+                victims=run.victims,
+            )
+            for run in stats.recent
+        ],
+    )
@@ -0,0 +1,138 @@
+"""
+WebSocket game sessions: tasks down, pipelined answers up.
+
+Protocol (JSON text frames):
+    server -> {"type": "task", "task": TaskResponse}
+    client -> {"type": "answer", "task_id": "<uuid>", "answer": 42}
+    server -> {"type": "result", "task_id": "<uuid>", **SubmitAnswerResponse}
+    server -> {"type": "error", "detail": "..."}
+
+Up to ``window`` unanswered tasks are kept in flight. Answers may be sent
+without waiting for results; whatever has queued up is graded together
+through task_service.submit_answers and results are pushed as they land.
+"""
+
+import asyncio
+import contextlib
+from uuid import UUID
+
+from db import async_session
+from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+from schemas import SubmitBatchItem
+from services import task_service
+from state import task_delivery
+
+from routes.tasks import STREAM_POLL_SECONDS, lease_tasks, task_to_response
+
+router = APIRouter(tags=["sessions"])
+
+MAX_GRADE_BATCH = 100
+
+
+class GameSession:
+    """One individual's task exchange over a WebSocket."""
+
+    def __init__(self, websocket: WebSocket, individual_id: str, window: int):
+        self.websocket = websocket
+        self.individual_id = individual_id
+        self.subscription = task_delivery.Subscription(individual_id, window)
+        self.answers: asyncio.Queue[tuple[UUID, int]] = asyncio.Queue()
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, message: dict) -> None:
+        async with self._send_lock:
+            await self.websocket.send_json(message)
+
+    async def feed(self) -> None:
+        """Keep the window full of leased tasks."""
+        while True:
+            task_delivery.hub.expire(self.subscription)
+            if not self.subscription.free_slots:
+                await self.subscription.wait_settled(STREAM_POLL_SECONDS)
+                continue
+            async with async_session() as db:
+                tasks = await lease_tasks(
+                    db, self.individual_id, self.subscription.free_slots
+                )
+            if not tasks:
+                await task_delivery.hub.wait_available(STREAM_POLL_SECONDS)
+                continue
+            task_delivery.hub.track(self.subscription, tasks)
+            for task in tasks:
+                data = task_to_response(task).model_dump(mode="json")
+                await self.send({"type": "task", "task": data})
+
+    async def receive(self) -> None:
+        """Queue answers from the client until it disconnects."""
+        while True:
+            message = await self.websocket.receive_text()
+            try:
+                item = SubmitBatchItem.model_validate_json(message)
+            except ValidationError as e:
+                await self.send({"type": "error", "detail": str(e)})
+                continue
+            self.answers.put_nowait((item.task_id, item.answer))
+
+    async def grade(self) -> None:
+        """Grade queued answers in batches and push their results."""
+        while True:
+            batch = [await self.answers.get()]
+            while not self.answers.empty() and len(batch) < MAX_GRADE_BATCH:
+                batch.append(self.answers.get_nowait())
+
+            async with async_session() as db:
+                try:
+                    results = await task_service.submit_answers(db, batch)
+                except ValueError:
+                    # Unknown task in the batch: grade one by one to isolate it
+                    results = [
+                        await self._grade_one(db, task_id, answer)
+                        for task_id, answer in batch
+                    ]
+            task_delivery.hub.settle([task_id for task_id, _ in batch])
+            for (task_id, _), result in zip(batch, results):
+                if result is not None:
+                    data = {"task_id": str(task_id), **result._asdict()}
+                    await self.send({"type": "result", **data})
+
+    async def _grade_one(self, db, task_id: UUID, answer: int):
+        try:
+            return await task_service.submit_answer(db, task_id, answer)
+        except ValueError as e:
+            data = {"task_id": str(task_id), "detail": str(e)}
+            await self.send({"type": "error", **data})
+            return None
+
+    async def run(self) -> None:
+        """Run until the client disconnects or a loop fails."""
+        loops = [
+            asyncio.create_task(self.feed()),
+            asyncio.create_task(self.receive()),
+            asyncio.create_task(self.grade()),
+        ]
+        try:
+            done, _ = await asyncio.wait(loops, return_when=asyncio.FIRST_COMPLETED)
+            for loop in done:
+                with contextlib.suppress(WebSocketDisconnect):
+                    loop.result()
+        finally:
+            for loop in loops:
+                loop.cancel()
+            await asyncio.gather(*loops, return_exceptions=True)
+            task_delivery.hub.unsubscribe(self.subscription)
+
+
+@router.websocket("/ws/session/{individual_id}")
+async def game_session(
+    websocket: WebSocket,
+    individual_id: str,
+    window: int = Query(8, ge=1, le=100),
+):
+    """
+    Exchange tasks and answers with one individual over a WebSocket.
+
+    Leases held when the connection drops expire and are swept back.
+    """
+    await websocket.accept()
+    await GameSession(websocket, individual_id, window).run()
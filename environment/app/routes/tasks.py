@@ -0,0 +1,245 @@
+"""Task routes: generation, leasing, push delivery, grading and stats."""
+
+import os
+import time
+from dataclasses import asdict
+from uuid import UUID
+
+from db import Task, async_session, get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from schemas import (
+    GenerateTasksRequest,
+    GenerateTasksResponse,
+    LeaseSweeperStatsResponse,
+    SubmitAnswerRequest,
+    SubmitAnswerResponse,
+    SubmitBatchRequest,
+    SubmitBatchResponse,
+    TaskLeaseResponse,
+    TaskPrefetchStatsResponse,
+    TaskResponse,
+    TaskStatsReconcileResponse,
+    TaskStatsResponse,
+)
+from services import procedural_tasks, task_service
+from sqlalchemy.ext.asyncio import AsyncSession
+from state import task_delivery
+from workers import lease_sweeper, task_prefetch
+
+from routes.conditional import not_modified, weak_etag
+
+STREAM_POLL_SECONDS = float(os.getenv("TASK_STREAM_POLL_SECONDS", "5"))
+
+router = APIRouter(tags=["tasks"])
+
+
+@router.post("/tasks/generate", response_model=GenerateTasksResponse)
+async def generate_tasks(
+    request: GenerateTasksRequest, db: AsyncSession = Depends(get_db)
+):
+    """
+    Bulk-generate tasks for a seed and report the load rate.
+
+    With ``stateless`` no rows are written: the seed's stream is extended and
+    tasks are derived from (seed, index) when served.
+    """
+    started = time.perf_counter()
+    if request.stateless:
+        try:
+            count = await procedural_tasks.register_stream(
+                db, request.seed, request.count
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    else:
+        count = await task_service.generate_tasks(db, request.seed, request.count)
+    elapsed = time.perf_counter() - started
+    task_delivery.hub.notify_available()
+    return GenerateTasksResponse(
+        generated=count,
+        seed=request.seed,
+        elapsed_ms=round(elapsed * 1000, 3),
+        rows_per_second=round(count / elapsed, 1) if elapsed > 0 else 0.0,
+    )
+
+
+def task_to_response(task: Task) -> TaskResponse:
+    """Convert Task model to response, formatting the lease deadline."""
+    return TaskResponse(
+        id=task.id,
+        operand_a=task.operand_a,
+        operand_b=task.operand_b,
+        operator=task.operator,
+        reward=task.reward,
+        lease_expires_at=(
+            task.lease_expires_at.isoformat() if task.lease_expires_at else None
+        ),
+    )
+
+
+async def lease_tasks(
+    db: AsyncSession, individual_id: str | None, count: int
+) -> list[Task]:
+    """
+    Take tasks from the prefetch buffer, claiming only the shortfall. Either
+    way the tasks end up leased to ``individual_id``.
+    """
+    tasks = task_prefetch.buffer.take(count, individual_id)
+    if len(tasks) < count:
+        tasks += await task_service.get_next_task(
+            db, individual_id, count - len(tasks)
+        )
+    return tasks
+
+
+@router.get(
+    "/tasks/next", response_model=TaskResponse | TaskLeaseResponse | None
+)
+async def get_next_task(
+    individual_id: str | None = None,
+    count: int | None = Query(None, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Lease the oldest pending task(s) to the caller.
+
+    Without ``count`` a single task (or null) is returned. With ``count`` up
+    to that many tasks are claimed in one round trip. Tasks are served from
+    the prefetch buffer first (re-leased to the caller by a batched write
+    within TASK_PREFETCH_HANDOFF_MS) and only the shortfall is claimed from
+    the database.
+    """
+    tasks = await lease_tasks(db, individual_id, count or 1)
+    if count is not None:
+        return TaskLeaseResponse(tasks=[task_to_response(t) for t in tasks])
+    if not tasks:
+        return None
+    return task_to_response(tasks[0])
+
+
+async def _task_events(
+    request: Request, individual_id: str | None, max_in_flight: int
+):
+    """Yield leased tasks as SSE events while the subscriber has free slots."""
+    subscription = task_delivery.Subscription(individual_id, max_in_flight)
+    try:
+        while not await request.is_disconnected():
+            task_delivery.hub.expire(subscription)
+            if subscription.free_slots:
+                async with async_session() as db:
+                    tasks = await lease_tasks(
+                        db, individual_id, subscription.free_slots
+                    )
+                if tasks:
+                    task_delivery.hub.track(subscription, tasks)
+                    for task in tasks:
+                        data = task_to_response(task).model_dump_json()
+                        yield f"event: task\nid: {task.id}\ndata: {data}\n\n"
+                    continue
+                await task_delivery.hub.wait_available(STREAM_POLL_SECONDS)
+            else:
+                await subscription.wait_settled(STREAM_POLL_SECONDS)
+            yield ": keepalive\n\n"
+    finally:
+        task_delivery.hub.unsubscribe(subscription)
+
+
+@router.get("/tasks/stream")
+async def stream_tasks(
+    request: Request,
+    individual_id: str | None = None,
+    max_in_flight: int = Query(4, ge=1, le=100),
+):
+    """
+    Push leased tasks to the caller as Server-Sent Events.
+
+    At most ``max_in_flight`` unanswered tasks are outstanding at once; each
+    answer submitted through the submit endpoints frees a slot, as does a
+    lease that runs out unanswered. Leases of a disconnected subscriber
+    expire and are swept back to the pool.
+    """
+    return StreamingResponse(
+        _task_events(request, individual_id, max_in_flight),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@router.post("/tasks/{task_id}/submit", response_model=SubmitAnswerResponse)
+async def submit_answer(
+    task_id: UUID, request: SubmitAnswerRequest, db: AsyncSession = Depends(get_db)
+):
+    """Grade an answer; a repeated submit is reported as already graded."""
+    try:
+        result = await task_service.submit_answer(db, task_id, request.answer)
+        task_delivery.hub.settle([task_id])
+        return SubmitAnswerResponse(**result._asdict())
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.post("/tasks/submit_batch", response_model=SubmitBatchResponse)
+async def submit_batch(request: SubmitBatchRequest, db: AsyncSession = Depends(get_db)):
+    """Grade many answers in one transaction; results follow request order."""
+    try:
+        results = await task_service.submit_answers(
+            db, [(item.task_id, item.answer) for item in request.answers]
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    task_delivery.hub.settle([item.task_id for item in request.answers])
+    return SubmitBatchResponse(
+        results=[SubmitAnswerResponse(**result._asdict()) for result in results]
+    )
+
+
+@router.get("/tasks/stats", response_model=TaskStatsResponse)
+async def get_stats(
+    request: Request, response: Response, db: AsyncSession = Depends(get_db)
+):
+    """
+    Get task counts by status from the incrementally maintained counters.
+
+    The counts double as a weak ETag; a matching If-None-Match gets a 304.
+    """
+    stats = await task_service.get_stats(db)
+    etag = weak_etag("stats", *stats.values())
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    response.headers["ETag"] = etag
+    return TaskStatsResponse(**stats)
+
+
+@router.post("/tasks/stats/reconcile", response_model=TaskStatsReconcileResponse)
+async def reconcile_stats(db: AsyncSession = Depends(get_db)):
+    """Recount the tasks table and reset the stats counters to match it."""
+    counters, actual = await task_service.reconcile_stats(db)
+    return TaskStatsReconcileResponse(
+        counters=TaskStatsResponse(**counters),
+        actual=TaskStatsResponse(**actual),
+        consistent=counters == actual,
+    )
+
+
+@router.get("/tasks/leases/stats", response_model=LeaseSweeperStatsResponse)
+def get_lease_sweeper_stats():
+    """Get counters of the background lease sweeper."""
+    stats = lease_sweeper.stats
+    return LeaseSweeperStatsResponse(
+        runs=stats.runs,
+        errors=stats.errors,
+        reclaimed_total=stats.reclaimed_total,
+        last_reclaimed=stats.last_reclaimed,
+        last_run_at=stats.last_run_at.isoformat() if stats.last_run_at else None,
+    )
+
+
+@router.get("/tasks/prefetch/stats", response_model=TaskPrefetchStatsResponse)
+def get_prefetch_stats():
+    """Get the fill level and counters of the task prefetch buffer."""
+    buffer = task_prefetch.buffer
+    return TaskPrefetchStatsResponse(
+        buffered=len(buffer), size=buffer.size, **asdict(buffer.stats)
+    )
@@ -1,16 +1,20 @@
+from typing import Literal
 from uuid import UUID
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class GenerateTasksRequest(BaseModel):
     seed: int
-    count: int = 10
+    count: int = Field(10, ge=1)
+    stateless: bool = False
 
 
 class GenerateTasksResponse(BaseModel):
     generated: int
     seed: int
+    elapsed_ms: float = 0.0
+    rows_per_second: float = 0.0
 
 
 class TaskResponse(BaseModel):
@@ -19,11 +23,16 @@ class TaskResponse(BaseModel):
     operand_b: int
     operator: str
     reward: float
+    lease_expires_at: str | None = None
 
     class Config:
         from_attributes = True
 
 
+class TaskLeaseResponse(BaseModel):
+    tasks: list[TaskResponse]
+
+
 class SubmitAnswerRequest(BaseModel):
     answer: int
 
@@ -32,15 +41,56 @@ class SubmitAnswerResponse(BaseModel):
     correct: bool
     reward: float
     correct_answer: int
+    already_graded: bool = False
+
+
+class SubmitBatchItem(BaseModel):
+    task_id: UUID
+    answer: int
+
+
+class SubmitBatchRequest(BaseModel):
+    answers: list[SubmitBatchItem] = Field(min_length=1, max_length=1000)
+
+
+class SubmitBatchResponse(BaseModel):
+    results: list[SubmitAnswerResponse]
 
 
 class TaskStatsResponse(BaseModel):
     total: int
     pending: int
+    leased: int = 0
     completed: int
     failed: int
 
 
+class TaskStatsReconcileResponse(BaseModel):
+    counters: TaskStatsResponse
+    actual: TaskStatsResponse
+    consistent: bool
+
+
+class LeaseSweeperStatsResponse(BaseModel):
+    runs: int
+    errors: int
+    reclaimed_total: int
+    last_reclaimed: int
+    last_run_at: str | None = None
+
+
+class TaskPrefetchStatsResponse(BaseModel):
+    buffered: int
+    size: int
+    served: int
+    refills: int
+    prefetched: int
+    dropped: int
+    released: int
+    renewed: int = 0
+    handed_over: int = 0
+
+
 # === Individual Schemas ===
 
 
@@ -50,6 +100,12 @@ class IndividualRegisterRequest(BaseModel):
     body_url: str
 
 
+class IndividualRegisterBatchRequest(BaseModel):
+    individuals: list[IndividualRegisterRequest] = Field(
+        min_length=1, max_length=1000
+    )
+
+
 class IndividualHeartbeatRequest(BaseModel):
     energy: float
     age: int
@@ -57,6 +113,21 @@ class IndividualHeartbeatRequest(BaseModel):
     alive: bool
 
 
+class IndividualHeartbeatBatchItem(IndividualHeartbeatRequest):
+    id: str
+
+
+class IndividualHeartbeatBatchRequest(BaseModel):
+    heartbeats: list[IndividualHeartbeatBatchItem] = Field(
+        min_length=1, max_length=1000
+    )
+
+
+class IndividualHeartbeatBatchResponse(BaseModel):
+    applied: int
+    unknown: list[str]
+
+
 class IndividualResponse(BaseModel):
     id: str
     name: str
@@ -74,20 +145,116 @@ class IndividualResponse(BaseModel):
 
 class IndividualsListResponse(BaseModel):
     individuals: list[IndividualResponse]
+    next_cursor: str | None = None
+
+
+class StaleIndividual(BaseModel):
+    id: str
+    name: str
+    last_heartbeat: str
+    stale_since: str
+
+
+class StaleIndividualsResponse(BaseModel):
+    stale_after_seconds: float
+    tracked: int
+    individuals: list[StaleIndividual]
+
+
+class RegistryStatsResponse(BaseModel):
+    individuals: int
+    dirty: int
+    revision: int
+    flushes: int
+    flushed_total: int
+    flush_errors: int
+    history_recorded: int = 0
+    history_dropped: int = 0
+    change_cursor: int = 0
+    followed_total: int = 0
+    follow_errors: int = 0
+    loaded_at: str | None = None
+    last_flush_at: str | None = None
+
+
+class HeartbeatHistoryPoint(BaseModel):
+    ts: str
+    samples: int
+    energy: float
+    energy_min: float
+    energy_max: float
+    age: int
+    tasks_solved: int
+
+
+class HeartbeatHistoryResponse(BaseModel):
+    individual_id: str
+    resolution: str
+    points: list[HeartbeatHistoryPoint]
+
+
+class IndividualChangesResponse(BaseModel):
+    individuals: list[IndividualResponse]
+    cursor: int
+    has_more: bool
 
 
 # === Sacrifice Schemas ===
 
 
 class SacrificeCheckRequest(BaseModel):
-    min_individuals: int = 2
+    min_individuals: int = Field(2, ge=0)
+    # Batch mode: remove count individuals, or a fraction of the alive ones
+    count: int = Field(1, ge=1, le=100000)
+    fraction: float | None = Field(None, gt=0, le=1)
+    strategy: Literal["truncation", "tournament", "proportional"] = "truncation"
+    tournament_size: int = Field(3, ge=2, le=100)
+    seed: int | None = None
 
 
 class SacrificeCheckResponse(BaseModel):
     sacrificed: bool
     victim: IndividualResponse | None = None
+    victims: list[IndividualResponse] = []
     reason: str | None = None
 
 
+class SacrificeCandidateResponse(IndividualResponse):
+    stale: bool
+
+
+class SacrificeCandidatesResponse(BaseModel):
+    candidates: list[SacrificeCandidateResponse]
+    alive: int
+
+
+class SacrificedIndividualResponse(IndividualResponse):
+    sacrificed_at: str | None = None
+    cause: str | None = None
+
+
 class SacrificeHistoryResponse(BaseModel):
-    victims: list[IndividualResponse]
+    victims: list[SacrificedIndividualResponse]
+    next_cursor: str | None = None
+
+
+class SelectionRunResponse(BaseModel):
+    started_at: str
+    trigger: str
+    duration_ms: float
+    victims: int
+
+
+class SelectionSchedulerStatsResponse(BaseModel):
+    enabled: bool
+    leader: bool
+    elections: int
+    interval_seconds: float
+    max_population: int
+    strategy: str
+    runs: int
+    errors: int
+    victims_total: int
+    duration_total_ms: float
+    last_run_at: str | None = None
+    recent_runs: list[SelectionRunResponse] = []
@@ -1,5 +1,19 @@
 """Service modules for the Environment API."""
 
-from services import individual_service, sacrifice_service, task_service
+from services import (
+    heartbeat_history,
+    individual_service,
+    procedural_tasks,
+    sacrifice_service,
+    selection,
+    task_service,
+)
 
-__all__ = ["individual_service", "sacrifice_service", "task_service"]
+__all__ = [
+    "heartbeat_history",
+    "individual_service",
+    "procedural_tasks",
+    "sacrifice_service",
+    "selection",
+    "task_service",
+]
@@ -0,0 +1,249 @@
+"""
+Append-only heartbeat history with downsampling and retention.
+
+Raw samples go to ``heartbeat_history``, a narrow table partitioned by day,
+and are rolled up into 1 minute and 10 minute buckets. Retention drops whole
+raw partitions and deletes old rollup rows, so each coarser resolution
+covers a longer window than the one below it.
+"""
+
+import os
+from datetime import date, datetime, timedelta
+
+from db import HeartbeatRollup1m, HeartbeatRollup10m, HeartbeatSample
+from sqlalchemy import delete, func, literal_column, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+RAW_RETENTION_DAYS = int(os.getenv("HEARTBEAT_RAW_RETENTION_DAYS", "2"))
+ROLLUP_1M_RETENTION_DAYS = int(os.getenv("HEARTBEAT_1M_RETENTION_DAYS", "14"))
+ROLLUP_10M_RETENTION_DAYS = int(os.getenv("HEARTBEAT_10M_RETENTION_DAYS", "180"))
+# Raw partitions created ahead of time, in days
+PARTITIONS_AHEAD = 2
+# Samples reach the table up to one flush late; roll up behind that
+ROLLUP_DELAY = timedelta(minutes=1)
+SAMPLE_COLUMNS = ("individual_id", "ts", "energy", "age", "tasks_solved")
+ROLLUP_COLUMNS = (
+    "individual_id",
+    "bucket",
+    "samples",
+    "energy_avg",
+    "energy_min",
+    "energy_max",
+    "age",
+    "tasks_solved",
+)
+BUCKET_EPOCH = datetime(2000, 1, 1)
+# Serializes partition creation across API processes
+PARTITION_LOCK_KEY = 0x4B7A12
+MAX_POINTS = 10000
+
+
+def floor_bucket(ts: datetime, width: timedelta) -> datetime:
+    """Start of the ``width`` bucket containing ``ts``."""
+    return BUCKET_EPOCH + (ts - BUCKET_EPOCH) // width * width
+
+
+def _date_bin(width: timedelta, ts):
+    # Inlined rather than bound so SELECT and GROUP BY render identically
+    return func.date_bin(
+        literal_column(f"interval '{int(width.total_seconds())} seconds'"),
+        ts,
+        literal_column(f"timestamp '{BUCKET_EPOCH}'"),
+    )
+
+
+async def record(db: AsyncSession, samples: list[tuple]) -> int:
+    """
+    COPY (individual_id, ts, energy, age, tasks_solved) samples into the
+    history inside the session's open transaction. The caller commits.
+    """
+    connection = await db.connection()
+    driver = (await connection.get_raw_connection()).driver_connection
+    await driver.copy_records_to_table(
+        HeartbeatSample.__tablename__, records=samples, columns=SAMPLE_COLUMNS
+    )
+    return len(samples)
+
+
+async def ensure_partitions(db: AsyncSession, today: date) -> None:
+    """Create the raw partitions of today and the next PARTITIONS_AHEAD days."""
+    # IF NOT EXISTS alone still races on the catalog between processes
+    await db.execute(select(func.pg_advisory_xact_lock(PARTITION_LOCK_KEY)))
+    for offset in range(PARTITIONS_AHEAD + 1):
+        day = today + timedelta(days=offset)
+        await db.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS heartbeat_history_p{day:%Y%m%d} "
+                "PARTITION OF heartbeat_history "
+                f"FOR VALUES FROM ('{day}') TO ('{day + timedelta(days=1)}')"
+            )
+        )
+    await db.commit()
+
+
+async def _rollup(
+    db: AsyncSession,
+    source,
+    target,
+    width: timedelta,
+    lookback: timedelta,
+    upto: datetime,
+) -> int:
+    """
+    Build every complete ``width`` bucket of ``source`` before ``upto`` that
+    is newer than the newest bucket already in ``target``.
+    """
+    upto = floor_bucket(upto, width)
+    newest = await db.scalar(select(func.max(target.bucket)))
+    start = floor_bucket(upto - lookback, width) if newest is None else newest + width
+    if start >= upto:
+        return 0
+    if source is HeartbeatSample:
+        ts = source.ts
+        aggregates = (
+            func.count(),
+            func.avg(source.energy),
+            func.min(source.energy),
+            func.max(source.energy),
+        )
+    else:
+        ts = source.bucket
+        aggregates = (
+            func.sum(source.samples),
+            func.sum(source.energy_avg * source.samples) / func.sum(source.samples),
+            func.min(source.energy_min),
+            func.max(source.energy_max),
+        )
+    bucket = _date_bin(width, ts)
+    rows = (
+        select(
+            source.individual_id,
+            bucket,
+            *aggregates,
+            func.max(source.age),
+            func.max(source.tasks_solved),
+        )
+        .where(ts >= start, ts < upto)
+        .group_by(source.individual_id, bucket)
+    )
+    result = await db.execute(
+        insert(target).from_select(ROLLUP_COLUMNS, rows).on_conflict_do_nothing()
+    )
+    return result.rowcount
+
+
+async def rollup(db: AsyncSession, now: datetime) -> tuple[int, int]:
+    """
+    Downsample raw samples into 1 minute buckets and those into 10 minutes.
+
+    Only buckets that ended ROLLUP_DELAY before ``now`` are built, each
+    exactly once. Returns the number of (1m, 10m) rows written.
+    """
+    upto = now - ROLLUP_DELAY
+    minutes = await _rollup(
+        db,
+        HeartbeatSample,
+        HeartbeatRollup1m,
+        timedelta(minutes=1),
+        timedelta(days=RAW_RETENTION_DAYS),
+        upto,
+    )
+    tens = await _rollup(
+        db,
+        HeartbeatRollup1m,
+        HeartbeatRollup10m,
+        timedelta(minutes=10),
+        timedelta(days=ROLLUP_1M_RETENTION_DAYS),
+        upto,
+    )
+    await db.commit()
+    return minutes, tens
+
+
+async def apply_retention(db: AsyncSession, now: datetime) -> list[str]:
+    """
+    Drop raw partitions entirely older than RAW_RETENTION_DAYS and delete
+    rollup rows past their retention. Returns the dropped partitions.
+    """
+    cutoff = (now - timedelta(days=RAW_RETENTION_DAYS)).date()
+    result = await db.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'heartbeat_history'::regclass"
+        )
+    )
+    dropped = []
+    for (name,) in result:
+        day = datetime.strptime(name.rsplit("_p", 1)[1], "%Y%m%d").date()
+        # A partition holds one day; keep it while any of it is retained
+        if day + timedelta(days=1) <= cutoff:
+            await db.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            dropped.append(name)
+    await db.execute(
+        delete(HeartbeatRollup1m).where(
+            HeartbeatRollup1m.bucket < now - timedelta(days=ROLLUP_1M_RETENTION_DAYS)
+        )
+    )
+    await db.execute(
+        delete(HeartbeatRollup10m).where(
+            HeartbeatRollup10m.bucket < now - timedelta(days=ROLLUP_10M_RETENTION_DAYS)
+        )
+    )
+    await db.commit()
+    return dropped
+
+
+def pick_resolution(start: datetime, end: datetime, now: datetime | None = None) -> str:
+    """
+    Finest resolution whose point budget covers the range and whose
+    retention still reaches back to ``start``.
+    """
+    span = end - start
+    age = (now or datetime.utcnow()) - start
+    if span <= timedelta(hours=2) and age <= timedelta(days=RAW_RETENTION_DAYS):
+        return "raw"
+    if span <= timedelta(days=2) and age <= timedelta(days=ROLLUP_1M_RETENTION_DAYS):
+        return "1m"
+    return "10m"
+
+
+async def get_history(
+    db: AsyncSession,
+    individual_id: str,
+    start: datetime,
+    end: datetime,
+    resolution: str,
+    limit: int = MAX_POINTS,
+) -> list[tuple]:
+    """
+    Points of one individual in [start, end) at ``resolution`` ("raw", "1m"
+    or "10m"), oldest first, as (ts, samples, energy_avg, energy_min,
+    energy_max, age, tasks_solved).
+    """
+    if resolution == "raw":
+        s = HeartbeatSample
+        stmt = select(
+            s.ts, literal_column("1"), s.energy, s.energy, s.energy, s.age, s.tasks_solved
+        ).where(s.individual_id == individual_id, s.ts >= start, s.ts < end)
+        stmt = stmt.order_by(s.ts)
+    elif resolution in ("1m", "10m"):
+        r = HeartbeatRollup1m if resolution == "1m" else HeartbeatRollup10m
+        stmt = (
+            select(
+                r.bucket,
+                r.samples,
+                r.energy_avg,
+                r.energy_min,
+                r.energy_max,
+                r.age,
+                r.tasks_solved,
+            )
+            .where(r.individual_id == individual_id, r.bucket >= start, r.bucket < end)
+            .order_by(r.bucket)
+        )
+    else:
+        raise ValueError(f"Unknown resolution: {resolution}")
+    result = await db.execute(stmt.limit(limit))
+    return [tuple(row) for row in result]
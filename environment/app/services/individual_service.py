@@ -1,11 +1,110 @@
 """Service for managing individuals in the environment."""
 
-from datetime import datetime
+import base64
+import json
+import os
+from datetime import datetime, timezone
 
 from db import Individual
-from sqlalchemy import select
+from sqlalchemy import DateTime, Integer, case, cast, func, literal, select, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
+# Energy lost per second and seconds per year of age, applied lazily: rows
+# keep base energy and age as of state_at and current values are derived
+ENERGY_DECAY_PER_SECOND = float(os.getenv("ENERGY_DECAY_PER_SECOND", "0.01"))
+AGE_TICK_SECONDS = float(os.getenv("AGE_TICK_SECONDS", "60"))
+# Current values in an ETag are bucketed to this many seconds
+DECAY_ETAG_SECONDS = float(os.getenv("DECAY_ETAG_SECONDS", "10"))
+INITIAL_ENERGY = 100.0
+HEARTBEAT_FIELDS = (
+    "last_heartbeat",
+    "energy",
+    "age",
+    "tasks_solved",
+    "alive",
+    "state_at",
+)
+# Rows per upsert statement, keeping bind parameters under asyncpg's limit
+UPSERT_CHUNK_SIZE = 1000
+LISTED_FIELDS = (
+    "id",
+    "name",
+    "body_url",
+    "registered_at",
+    "last_heartbeat",
+    "energy",
+    "age",
+    "tasks_solved",
+    "alive",
+)
+CHANGES_LIMIT = 1000
+
+
+def _epoch(ts: datetime) -> float:
+    return ts.replace(tzinfo=timezone.utc).timestamp()
+
+
+def energy_key(energy: float, state_at: datetime) -> float:
+    """
+    Time-invariant sort key of current energy.
+
+    With one global decay rate, current energy is energy_key minus
+    rate * now for every alive individual, so ordering by the stored key is
+    ordering by current energy at any moment without rewriting rows.
+    """
+    return energy + ENERGY_DECAY_PER_SECOND * _epoch(state_at)
+
+
+def energy_key_sql(energy, state_at):
+    """energy_key() as a SQL expression."""
+    return energy + ENERGY_DECAY_PER_SECOND * func.extract("epoch", state_at)
+
+
+def decayed(individual, now: datetime) -> tuple[float, int]:
+    """Current (energy, age) of an individual; the dead no longer decay."""
+    if not individual.alive or individual.state_at is None:
+        return individual.energy, individual.age
+    elapsed = max(0.0, (now - individual.state_at).total_seconds())
+    energy = max(0.0, individual.energy - ENERGY_DECAY_PER_SECOND * elapsed)
+    return energy, individual.age + int(elapsed // AGE_TICK_SECONDS)
+
+
+def decayed_sql(now: datetime) -> dict:
+    """decayed() as SQL assignments freezing current energy and age at ``now``."""
+    elapsed = func.extract("epoch", literal(now, DateTime) - Individual.state_at)
+    return {
+        "energy": func.greatest(
+            0.0, Individual.energy - ENERGY_DECAY_PER_SECOND * elapsed
+        ),
+        "age": Individual.age
+        + cast(func.floor(elapsed / AGE_TICK_SECONDS), Integer),
+        "state_at": now,
+    }
+
+
+def decay_epoch(now: datetime) -> int:
+    """Bucket of time within which current values count as unchanged."""
+    if ENERGY_DECAY_PER_SECOND <= 0 and AGE_TICK_SECONDS <= 0:
+        return 0
+    return int(_epoch(now) // DECAY_ETAG_SECONDS)
+
+
+async def sync_energy_keys(db: AsyncSession) -> int:
+    """
+    Recompute energy keys that do not match the configured decay rate,
+    e.g. after ENERGY_DECAY_PER_SECOND changed. Writes nothing otherwise.
+    """
+    key = energy_key_sql(Individual.energy, Individual.state_at)
+    result = await db.execute(
+        update(Individual)
+        .where(func.abs(Individual.energy_key - key) > 1e-6 * func.abs(key) + 1e-6)
+        .values(energy_key=key)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return result.rowcount
+
 
 async def register_individual(
     db: AsyncSession,
@@ -14,75 +113,178 @@ async def register_individual(
     body_url: str,
 ) -> Individual:
     """Register a new individual or update existing."""
-    result = await db.execute(
-        select(Individual).where(Individual.id == individual_id)
-    )
-    individual = result.scalar_one_or_none()
-
-    if individual:
-        # Update existing individual
-        individual.last_heartbeat = datetime.utcnow()
-        individual.alive = True
-        individual.body_url = body_url
-    else:
-        # Create new individual
-        individual = Individual(
-            id=individual_id,
-            name=name,
-            body_url=body_url,
-        )
-        db.add(individual)
+    individuals = await register_individuals(db, [(individual_id, name, body_url)])
+    return individuals[0]
+
 
+async def register_individuals(
+    db: AsyncSession, registrations: list[tuple[str, str, str]]
+) -> list[Individual]:
+    """
+    Register or revive many (id, name, body_url) individuals at once.
+
+    Each chunk is one INSERT ... ON CONFLICT DO UPDATE ... RETURNING, so
+    concurrent registrations of the same id never race between a lookup and
+    an insert. Existing individuals are marked alive with a fresh heartbeat
+    and body_url; a dead one resumes decay from now and leaves the
+    sacrifice history. Results follow the
+    (deduplicated) order of the input.
+    """
+    latest = {registration[0]: registration for registration in registrations}
+    # Lock rows in id order so overlapping concurrent batches cannot deadlock
+    rows = sorted(latest.values())
+    now = datetime.utcnow()
+    registered: dict[str, Individual] = {}
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        stmt = insert(Individual).values(
+            [
+                {
+                    "id": individual_id,
+                    "name": name,
+                    "body_url": body_url,
+                    "registered_at": now,
+                    "last_heartbeat": now,
+                    "energy": INITIAL_ENERGY,
+                    "state_at": now,
+                    "energy_key": energy_key(INITIAL_ENERGY, now),
+                }
+                for individual_id, name, body_url in rows[start : start + UPSERT_CHUNK_SIZE]
+            ]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Individual.id],
+            set_={
+                "last_heartbeat": stmt.excluded.last_heartbeat,
+                "alive": True,
+                "body_url": stmt.excluded.body_url,
+                # A revived individual resumes decaying from now
+                "state_at": case(
+                    (Individual.alive, Individual.state_at),
+                    else_=stmt.excluded.state_at,
+                ),
+                "energy_key": case(
+                    (Individual.alive, Individual.energy_key),
+                    else_=energy_key_sql(Individual.energy, stmt.excluded.state_at),
+                ),
+                "sacrificed_at": None,
+                "cause": None,
+            },
+        )
+        result = await db.scalars(
+            stmt.returning(Individual),
+            execution_options={"populate_existing": True},
+        )
+        registered.update((individual.id, individual) for individual in result)
     await db.commit()
-    await db.refresh(individual)
-    return individual
+    return [registered[individual_id] for individual_id in latest]
 
 
-async def heartbeat(
-    db: AsyncSession,
-    individual_id: str,
-    energy: float,
-    age: int,
-    tasks_solved: int,
-    alive: bool,
-) -> Individual | None:
-    """Update individual's state from heartbeat."""
-    result = await db.execute(
-        select(Individual).where(Individual.id == individual_id)
-    )
-    individual = result.scalar_one_or_none()
+async def upsert_heartbeats(db: AsyncSession, individuals: list) -> int:
+    """
+    Write the heartbeat state of many individuals in one transaction.
 
-    if individual:
-        individual.last_heartbeat = datetime.utcnow()
-        individual.energy = energy
-        individual.age = age
-        individual.tasks_solved = tasks_solved
-        individual.alive = alive
-        await db.commit()
-        await db.refresh(individual)
+    Each chunk is a multi-row INSERT ... ON CONFLICT DO UPDATE that only
+    overwrites heartbeat fields of existing rows whose heartbeat and
+    sacrifice are both older; an alive beat clears the sacrifice. ``individuals`` are ORM objects or registry
+    records; the caller commits.
+    """
+    for start in range(0, len(individuals), UPSERT_CHUNK_SIZE):
+        stmt = insert(Individual).values(
+            [
+                {
+                    "id": individual.id,
+                    "name": individual.name,
+                    "body_url": individual.body_url,
+                    **{field: getattr(individual, field) for field in HEARTBEAT_FIELDS},
+                    "energy_key": energy_key(individual.energy, individual.state_at),
+                }
+                for individual in individuals[start : start + UPSERT_CHUNK_SIZE]
+            ]
+        )
+        await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[Individual.id],
+                set_={
+                    **{
+                        field: stmt.excluded[field]
+                        for field in (*HEARTBEAT_FIELDS, "energy_key")
+                    },
+                    # A beat that reports the body alive revives it
+                    "sacrificed_at": case(
+                        (stmt.excluded.alive, None), else_=Individual.sacrificed_at
+                    ),
+                    "cause": case((stmt.excluded.alive, None), else_=Individual.cause),
+                },
+                # Beats from before a sacrifice or a newer heartbeat, either
+                # possibly written by another process, are stale
+                where=(
+                    Individual.sacrificed_at.is_(None)
+                    | (Individual.sacrificed_at < stmt.excluded.last_heartbeat)
+                )
+                & (Individual.last_heartbeat <= stmt.excluded.last_heartbeat),
+            )
+        )
+    return len(individuals)
 
-    return individual
 
+def encode_cursor(name: str, individual_id: str) -> str:
+    """Opaque keyset cursor pointing just after (name, id)."""
+    raw = json.dumps([name, individual_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
 
-async def get_all_individuals(db: AsyncSession) -> list[Individual]:
-    """Get all registered individuals."""
-    result = await db.execute(select(Individual).order_by(Individual.name))
-    return list(result.scalars().all())
 
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    """Inverse of encode_cursor; raises ValueError on a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        name, individual_id = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(name, str) or not isinstance(individual_id, str):
+        raise ValueError("Invalid cursor")
+    return name, individual_id
 
-async def get_alive_individuals(db: AsyncSession) -> list[Individual]:
-    """Get all alive individuals, sorted by energy (ascending for sacrifice)."""
+
+def parse_fields(spec: str | None) -> tuple[str, ...]:
+    """Turn a comma-separated ``fields=`` projection into listed column names."""
+    if not spec:
+        return LISTED_FIELDS
+    fields = tuple(dict.fromkeys(f.strip() for f in spec.split(",") if f.strip()))
+    unknown = set(fields) - set(LISTED_FIELDS)
+    if not fields:
+        raise ValueError("No fields selected")
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return fields
+
+
+async def get_changes(
+    db: AsyncSession, since: int, limit: int = CHANGES_LIMIT
+) -> tuple[list[Individual], int, bool]:
+    """
+    Individuals written after change version ``since``, oldest change first.
+
+    Returns (individuals, cursor, has_more); passing the cursor back as
+    ``since`` resumes exactly after the last returned change.
+    """
     result = await db.execute(
         select(Individual)
-        .where(Individual.alive.is_(True))
-        .order_by(Individual.energy)
+        .where(Individual.version > since)
+        .order_by(Individual.version)
+        .limit(limit + 1)
     )
-    return list(result.scalars().all())
+    individuals = list(result.scalars().all())
+    has_more = len(individuals) > limit
+    individuals = individuals[:limit]
+    cursor = individuals[-1].version if individuals else since
+    return individuals, cursor, has_more
 
 
-async def get_individual(db: AsyncSession, individual_id: str) -> Individual | None:
-    """Get a specific individual by ID."""
+async def get_alive_individuals(db: AsyncSession) -> list[Individual]:
+    """Get all alive individuals, sorted by current energy (ascending for sacrifice)."""
     result = await db.execute(
-        select(Individual).where(Individual.id == individual_id)
+        select(Individual)
+        .where(Individual.alive.is_(True))
+        .order_by(Individual.energy_key)
     )
-    return result.scalar_one_or_none()
+    return list(result.scalars().all())
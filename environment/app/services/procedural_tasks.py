@@ -0,0 +1,163 @@
+"""
+Stateless procedural tasks derived from (seed, index).
+
+A procedural task is never stored until it is answered. Its id is a UUIDv8
+packing the seed, the index within the seed's stream and a keyed integrity
+tag, so operands and the correct answer can be regenerated from the id
+alone. Streams of such tasks are tracked per seed in ``task_streams``.
+
+Tags are keyed with PROCEDURAL_TASK_SECRET. Without it procedural tasks are
+disabled: no stream can be extended and no id decodes as procedural.
+"""
+
+import hashlib
+import hmac
+import os
+import struct
+from uuid import UUID
+
+from db import Task, TaskStream
+from sqlalchemy import func, select, true, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+_TAG_SECRET = os.getenv("PROCEDURAL_TASK_SECRET", "").encode()
+ENABLED = bool(_TAG_SECRET)
+_TAG_BITS = 58
+MAX_INDEX = 1 << 32
+
+
+def _pack(seed: int, index: int) -> bytes:
+    return struct.pack(">II", seed & 0xFFFFFFFF, index)
+
+
+def _tag(seed: int, index: int) -> int:
+    digest = hashlib.blake2b(_pack(seed, index), digest_size=8, key=_TAG_SECRET)
+    return int.from_bytes(digest.digest()) >> (64 - _TAG_BITS)
+
+
+def encode_task_id(seed: int, index: int) -> UUID:
+    """Pack seed, index and tag into the 122 free bits of a UUIDv8."""
+    payload = (
+        (seed & 0xFFFFFFFF) << (32 + _TAG_BITS)
+        | index << _TAG_BITS
+        | _tag(seed, index)
+    )
+    return UUID(
+        int=(payload >> 74) << 80
+        | 0x8 << 76
+        | ((payload >> 62) & 0xFFF) << 64
+        | 0b10 << 62
+        | payload & ((1 << 62) - 1)
+    )
+
+
+def decode_task_id(task_id: UUID) -> tuple[int, int] | None:
+    """Return (seed, index) of a procedural task id, or None if not one."""
+    if not ENABLED or task_id.version != 8:
+        return None
+    value = task_id.int
+    payload = (
+        (value >> 80) << 74
+        | ((value >> 64) & 0xFFF) << 62
+        | value & ((1 << 62) - 1)
+    )
+    seed = payload >> (32 + _TAG_BITS)
+    index = (payload >> _TAG_BITS) & 0xFFFFFFFF
+    if seed >= 1 << 31:
+        seed -= 1 << 32
+    tag = payload & ((1 << _TAG_BITS) - 1)
+    if not hmac.compare_digest(tag.to_bytes(8), _tag(seed, index).to_bytes(8)):
+        return None
+    return seed, index
+
+
+def derive_operands(seed: int, index: int) -> tuple[int, int]:
+    """Operands of task ``index`` in the stream of ``seed``."""
+    digest = hashlib.blake2b(_pack(seed, index), digest_size=8).digest()
+    return int.from_bytes(digest[:4]) % 101, int.from_bytes(digest[4:]) % 101
+
+
+def build_task(seed: int, index: int) -> Task:
+    """Transient (never added to a session) Task for (seed, index)."""
+    a, b = derive_operands(seed, index)
+    return Task(
+        id=encode_task_id(seed, index),
+        seed=seed,
+        operand_a=a,
+        operand_b=b,
+        operator="+",
+        correct_answer=a + b,
+        reward=1.0,
+        status="leased",
+    )
+
+
+async def register_stream(db: AsyncSession, seed: int, count: int) -> int:
+    """
+    Make ``count`` more procedural tasks of ``seed`` available; raises
+    ValueError if procedural tasks are disabled.
+    """
+    if not ENABLED:
+        raise ValueError("Procedural tasks are disabled: PROCEDURAL_TASK_SECRET is not set")
+    stmt = insert(TaskStream).values(seed=seed, total=min(count, MAX_INDEX))
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[TaskStream.seed],
+            set_={"total": func.least(TaskStream.total + count, MAX_INDEX)},
+        )
+    )
+    await db.commit()
+    return count
+
+
+async def claim(db: AsyncSession, count: int) -> list[Task]:
+    """
+    Reserve up to ``count`` procedural tasks from the oldest open streams.
+
+    Concurrent claims queue on the stream row rather than skipping it, as
+    there is usually a single stream. Only the stream cursor is written;
+    the caller commits.
+    """
+    tasks: list[Task] = []
+    while ENABLED and len(tasks) < count:
+        stream = (
+            select(TaskStream.seed, TaskStream.next_index)
+            .where(TaskStream.next_index < TaskStream.total)
+            .order_by(TaskStream.created_at)
+            .limit(1)
+            .with_for_update()
+            .subquery("claimed")
+        )
+        result = await db.execute(
+            update(TaskStream)
+            .where(TaskStream.seed == stream.c.seed)
+            .values(
+                next_index=func.least(
+                    TaskStream.next_index + count - len(tasks), TaskStream.total
+                )
+            )
+            .returning(TaskStream.seed, stream.c.next_index, TaskStream.next_index)
+            .execution_options(synchronize_session=False)
+        )
+        claimed = result.one_or_none()
+        if claimed is None:
+            # The stream waited on may have run out meanwhile; try the next
+            if await db.scalar(
+                select(true()).where(TaskStream.next_index < TaskStream.total).limit(1)
+            ):
+                continue
+            break
+        seed, start, stop = claimed
+        tasks.extend(build_task(seed, index) for index in range(start, stop))
+    return tasks
+
+
+async def issued(db: AsyncSession, keys: list[tuple[int, int]]) -> set[tuple[int, int]]:
+    """The (seed, index) pairs among ``keys`` that a claim has handed out."""
+    seeds = {seed for seed, _ in keys}
+    result = await db.execute(
+        select(TaskStream.seed, TaskStream.next_index).where(TaskStream.seed.in_(seeds))
+    )
+    next_index = dict(result.all())
+    return {(seed, index) for seed, index in keys if index < next_index.get(seed, 0)}
@@ -1,74 +1,224 @@
 """Service for managing sacrifice/selection of individuals."""
 
 import logging
-from datetime import datetime, timedelta
+import math
+from datetime import datetime, timedelta, timezone
 
 from db import Individual
-from sqlalchemy import select
+from sqlalchemy import case, func, literal, select, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from services import individual_service, selection
+
 logger = logging.getLogger(__name__)
 
+# Serializes sacrifices across requests and API processes
+SACRIFICE_LOCK_KEY = 0x5AC21F1CE
+HISTORY_LIMIT = 100
+
+
+def _killed(now: datetime, stale_threshold: datetime, cause: str) -> dict:
+    """
+    SET clause of a sacrifice: frozen decayed state, time of death and
+    cause ("stale" for individuals past the heartbeat threshold).
+    """
+    return {
+        "alive": False,
+        **individual_service.decayed_sql(now),
+        "sacrificed_at": now,
+        "cause": case(
+            (Individual.last_heartbeat < stale_threshold, "stale"), else_=literal(cause)
+        ),
+    }
+
 
 async def check_for_sacrifice(
     db: AsyncSession,
     min_individuals: int = 2,
-    stale_threshold_minutes: int = 5,
+    stale_threshold_minutes: float = 5,
 ) -> Individual | None:
     """
     Check if any individual should be sacrificed.
 
     Rules:
     1. Only sacrifice if > min_individuals alive
-    2. Sacrifice stale individuals first (no heartbeat for threshold)
-    3. Then sacrifice lowest energy individual
+    2. Sacrifice stale individuals first (no heartbeat for threshold),
+       longest silent first
+    3. Then sacrifice lowest (current) energy individual
+
+    Selection and kill are one UPDATE: each rule is an index probe (partial
+    indexes over alive rows on last_heartbeat and energy_key) that skips
+    rows locked by concurrent writers, and the count guard stops an
+    OFFSET min_individuals probe early. Concurrent checks serialize on an
+    advisory lock taken first, so each one sees the previous kill and the
+    guard can never be overshot. The victim's decayed energy and age, the
+    time of death and the cause are recorded in the same statement.
 
     Returns the sacrificed individual or None if no sacrifice occurred.
     """
-    # Get all alive individuals
-    result = await db.execute(
-        select(Individual)
-        .where(Individual.alive.is_(True))
-        .order_by(Individual.energy)
-    )
-    alive = list(result.scalars().all())
+    now = datetime.utcnow()
+    stale_threshold = now - timedelta(minutes=stale_threshold_minutes)
+    await db.execute(select(func.pg_advisory_xact_lock(SACRIFICE_LOCK_KEY)))
 
-    if len(alive) <= min_individuals:
+    # Bare column so the predicate matches the partial indexes' WHERE alive
+    alive = Individual.alive
+    guard = select(Individual.id).where(alive).offset(min_individuals).limit(1).exists()
+    stale = (
+        select(Individual.id)
+        .where(alive, guard, Individual.last_heartbeat < stale_threshold)
+        .order_by(Individual.last_heartbeat)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    weakest = (
+        select(Individual.id)
+        .where(alive, guard)
+        .order_by(Individual.energy_key)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    victim = await db.scalar(
+        update(Individual)
+        .where(Individual.id == func.coalesce(stale, weakest), alive)
+        .values(**_killed(now, stale_threshold, "energy"))
+        .returning(Individual)
+        .execution_options(populate_existing=True, synchronize_session=False)
+    )
+    await db.commit()
+    if victim is None:
         return None
 
-    stale_threshold = datetime.utcnow() - timedelta(minutes=stale_threshold_minutes)
-
-    # First check for stale individuals
-    for individual in alive:
-        if individual.last_heartbeat < stale_threshold:
-            logger.info(
-                f"Sacrificing stale individual: {individual.name} "
-                f"(last heartbeat: {individual.last_heartbeat})"
-            )
-            individual.alive = False
-            await db.commit()
-            return individual
-
-    # If no stale, sacrifice lowest energy
-    victim = alive[0]  # Sorted by energy ascending
-    logger.info(
-        f"Sacrificing lowest energy individual: {victim.name} "
-        f"(energy={victim.energy})"
+    if victim.cause == "stale":
+        logger.info(
+            f"Sacrificing stale individual: {victim.name} "
+            f"(last heartbeat: {victim.last_heartbeat})"
+        )
+    else:
+        logger.info(
+            f"Sacrificing lowest energy individual: {victim.name} "
+            f"(energy={victim.energy:.2f})"
+        )
+    return victim
+
+
+def _cause(strategy: str) -> str:
+    # Truncation removes the lowest energy, like the single check
+    return "energy" if strategy == "truncation" else strategy
+
+
+async def cull(
+    db: AsyncSession,
+    strategy: str,
+    count: int | None = None,
+    fraction: float | None = None,
+    min_individuals: int = 2,
+    stale_threshold_minutes: float = 5,
+    seed: int | None = None,
+    tournament_size: int = 3,
+) -> list[Individual]:
+    """
+    Sacrifice ``count`` individuals, or ``fraction`` of the alive ones, at
+    once with a selection strategy (see services.selection).
+
+    Strategies run over a snapshot of the alive population scored by
+    current energy, stale individuals scoring lowest. Never culls below
+    min_individuals. Snapshot, selection and kill happen in one transaction
+    under the sacrifice advisory lock. Returns the victims, worst first.
+    """
+    now = datetime.utcnow()
+    stale_threshold = now - timedelta(minutes=stale_threshold_minutes)
+    await db.execute(select(func.pg_advisory_xact_lock(SACRIFICE_LOCK_KEY)))
+
+    result = await db.execute(
+        select(Individual.id, Individual.energy_key, Individual.last_heartbeat).where(
+            Individual.alive
+        )
     )
-    victim.alive = False
+    offset = individual_service.ENERGY_DECAY_PER_SECOND * now.replace(
+        tzinfo=timezone.utc
+    ).timestamp()
+    population = [
+        (
+            individual_id,
+            selection.STALE_FITNESS
+            if last_heartbeat < stale_threshold
+            else max(0.0, key - offset),
+        )
+        for individual_id, key, last_heartbeat in result
+    ]
+    wanted = count if count is not None else math.ceil((fraction or 0) * len(population))
+    wanted = min(wanted, len(population) - min_individuals)
+    if wanted <= 0:
+        await db.rollback()
+        return []
+
+    victim_ids = selection.select(
+        strategy, population, wanted, seed=seed, tournament_size=tournament_size
+    )
+    result = await db.scalars(
+        update(Individual)
+        .where(Individual.id.in_(victim_ids), Individual.alive)
+        .values(**_killed(now, stale_threshold, _cause(strategy)))
+        .returning(Individual)
+        .execution_options(populate_existing=True, synchronize_session=False)
+    )
+    victims = {victim.id: victim for victim in result}
     await db.commit()
-    return victim
+    logger.info(f"Culled {len(victims)} individuals by {strategy} selection")
+    return [victims[i] for i in victim_ids if i in victims]
+
+
+async def sacrifice(
+    db: AsyncSession,
+    strategy: str = "truncation",
+    count: int = 1,
+    fraction: float | None = None,
+    min_individuals: int = 2,
+    stale_threshold_minutes: float = 5,
+    seed: int | None = None,
+    tournament_size: int = 3,
+) -> list[Individual]:
+    """
+    Run one selection: a single truncation kill goes through
+    check_for_sacrifice, anything else (``count`` > 1, ``fraction`` or
+    another strategy) through cull. Returns the victims, worst first.
+    """
+    if count > 1 or fraction is not None or strategy != "truncation":
+        return await cull(
+            db,
+            strategy,
+            count=None if fraction is not None else count,
+            fraction=fraction,
+            min_individuals=min_individuals,
+            stale_threshold_minutes=stale_threshold_minutes,
+            seed=seed,
+            tournament_size=tournament_size,
+        )
+    victim = await check_for_sacrifice(db, min_individuals, stale_threshold_minutes)
+    return [victim] if victim else []
+
+
+async def count_alive(db: AsyncSession) -> int:
+    """Number of alive individuals."""
+    return await db.scalar(
+        select(func.count()).select_from(Individual).where(Individual.alive)
+    )
 
 
 async def get_sacrifice_candidates(
     db: AsyncSession,
     min_individuals: int = 2,
 ) -> list[Individual]:
-    """Get individuals that could be sacrificed (lowest energy first)."""
+    """
+    Get individuals that could be sacrificed (lowest current energy first).
+
+    Reads the table in order of the alive energy_key index; the API serves
+    the in-memory ranking (state.candidates) instead.
+    """
     result = await db.execute(
-        select(Individual)
-        .where(Individual.alive.is_(True))
-        .order_by(Individual.energy)
+        select(Individual).where(Individual.alive).order_by(Individual.energy_key)
     )
     alive = list(result.scalars().all())
 
@@ -79,9 +229,44 @@ async def get_sacrifice_candidates(
     return alive[: len(alive) - min_individuals]
 
 
-async def get_sacrifice_history(db: AsyncSession) -> list[Individual]:
-    """Get all sacrificed (dead) individuals."""
-    result = await db.execute(
-        select(Individual).where(Individual.alive.is_(False))
+async def get_sacrifice_history(
+    db: AsyncSession,
+    limit: int = HISTORY_LIMIT,
+    after: tuple[datetime, str] | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+) -> tuple[list[tuple[str, int]], tuple[datetime, str] | None]:
+    """
+    (id, version) of sacrificed individuals, newest first, keyset-paginated
+    on (sacrificed_at, id) and optionally limited to [start, end).
+
+    Walks the sacrificed_at index, so a page costs the same however long
+    the history. Returns the page and the key to continue after, or None
+    on the last page; load the rows with ``get_victims``.
+    """
+    stmt = select(Individual.id, Individual.version, Individual.sacrificed_at).where(
+        Individual.sacrificed_at.is_not(None)
+    )
+    if start is not None:
+        stmt = stmt.where(Individual.sacrificed_at >= start)
+    if end is not None:
+        stmt = stmt.where(Individual.sacrificed_at < end)
+    if after is not None:
+        stmt = stmt.where(tuple_(Individual.sacrificed_at, Individual.id) < tuple_(*after))
+    stmt = stmt.order_by(Individual.sacrificed_at.desc(), Individual.id.desc())
+    rows = (await db.execute(stmt.limit(limit + 1))).all()
+    last = (rows[limit - 1].sacrificed_at, rows[limit - 1].id) if len(rows) > limit else None
+    return [(row.id, row.version) for row in rows[:limit]], last
+
+
+async def get_victims(db: AsyncSession, individual_ids: list[str]) -> list[Individual]:
+    """Sacrificed individuals by id, newest first; revived ones are skipped."""
+    if not individual_ids:
+        return []
+    return list(
+        await db.scalars(
+            select(Individual)
+            .where(Individual.id.in_(individual_ids), Individual.sacrificed_at.is_not(None))
+            .order_by(Individual.sacrificed_at.desc(), Individual.id.desc())
+        )
     )
-    return list(result.scalars().all())
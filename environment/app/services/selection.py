@@ -0,0 +1,82 @@
+"""
+Selection strategies choosing which individuals a batch cull removes.
+
+Strategies work on a population snapshot of (id, fitness) pairs, where
+fitness is current energy and stale individuals rank below everyone. Each
+returns the ids to remove, worst first.
+"""
+
+import heapq
+import math
+import random
+
+STRATEGIES = ("truncation", "tournament", "proportional")
+# Stale individuals are less fit than any live energy level
+STALE_FITNESS = -1.0
+
+
+def truncation(
+    population: list[tuple[str, float]], count: int, rng: random.Random
+) -> list[str]:
+    """The ``count`` least fit individuals."""
+    return [i for i, _ in heapq.nsmallest(count, population, key=lambda p: p[1])]
+
+
+def tournament(
+    population: list[tuple[str, float]],
+    count: int,
+    rng: random.Random,
+    size: int = 3,
+) -> list[str]:
+    """
+    Repeat ``count`` times: draw ``size`` remaining individuals at random
+    and remove the least fit of them.
+    """
+    remaining = list(population)
+    victims = []
+    for _ in range(min(count, len(remaining))):
+        picks = rng.sample(range(len(remaining)), min(size, len(remaining)))
+        worst = min(picks, key=lambda index: remaining[index][1])
+        victims.append(remaining[worst][0])
+        # Swap-remove keeps each round O(size)
+        remaining[worst] = remaining[-1]
+        remaining.pop()
+    return victims
+
+
+def proportional(
+    population: list[tuple[str, float]], count: int, rng: random.Random
+) -> list[str]:
+    """
+    Remove ``count`` individuals without replacement, each with probability
+    proportional to how far it falls below the fittest (roulette wheel on
+    inverted fitness, sampled with Efraimidis-Spirakis keys).
+    """
+    if not population:
+        return []
+    best = max(fitness for _, fitness in population)
+    # Everyone keeps a small chance; the fittest is not immune
+    floor = max(1e-9, 0.01 * (best - min(f for _, f in population)))
+    keyed = (
+        (math.log(1.0 - rng.random()) / (best - fitness + floor), individual_id)
+        for individual_id, fitness in population
+    )
+    return [i for _, i in heapq.nlargest(count, keyed)]
+
+
+def select(
+    strategy: str,
+    population: list[tuple[str, float]],
+    count: int,
+    seed: int | None = None,
+    tournament_size: int = 3,
+) -> list[str]:
+    """Run ``strategy`` over the snapshot; raises ValueError if unknown."""
+    rng = random.Random(seed)
+    if strategy == "truncation":
+        return truncation(population, count, rng)
+    if strategy == "tournament":
+        return tournament(population, count, rng, tournament_size)
+    if strategy == "proportional":
+        return proportional(population, count, rng)
+    raise ValueError(f"Unknown selection strategy: {strategy}")
@@ -1,72 +1,430 @@
+import os
 import random
-from datetime import datetime
+from collections.abc import Iterator
+from datetime import datetime, timedelta
+from typing import NamedTuple
 from uuid import UUID
 
-from db import Task
-from sqlalchemy import func, select
+from db import Task, TaskCounter
+from sqlalchemy import (
+    DateTime,
+    Integer,
+    String,
+    case,
+    column,
+    delete,
+    func,
+    select,
+    text,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from services import procedural_tasks
+
+LEASE_SECONDS = int(os.getenv("TASK_LEASE_SECONDS", "60"))
+OPEN_STATUSES = ("pending", "leased")
+STAT_STATUSES = ("pending", "leased", "completed", "failed")
+GENERATE_CHUNK_SIZE = int(os.getenv("TASK_GENERATE_CHUNK_SIZE", "10000"))
+COPY_COLUMNS = (
+    "seed",
+    "operand_a",
+    "operand_b",
+    "operator",
+    "correct_answer",
+    "reward",
+    "status",
+    "created_at",
+)
+
+
+class GradeResult(NamedTuple):
+    correct: bool
+    reward: float
+    correct_answer: int
+    already_graded: bool = False
+
+
+def iter_task_rows(
+    seed: int, count: int, chunk_size: int = GENERATE_CHUNK_SIZE
+) -> Iterator[list[tuple]]:
+    """
+    Yield COPY rows for ``count`` tasks of ``seed``, ``chunk_size`` at a time.
+
+    Operands follow the random.Random(seed) sequence, so a seed always yields
+    the same tasks, and only one chunk is held in memory at once.
+    """
+    draw = random.Random(seed).randrange
+    for start in range(0, count, chunk_size):
+        operands = [draw(101) for _ in range(2 * min(chunk_size, count - start))]
+        created_at = datetime.utcnow()
+        yield [
+            (seed, a, b, "+", a + b, 1.0, "pending", created_at)
+            for a, b in zip(operands[::2], operands[1::2])
+        ]
+
 
 async def generate_tasks(db: AsyncSession, seed: int, count: int) -> int:
-    rng = random.Random(seed)
-    tasks = []
-    for _ in range(count):
-        a = rng.randint(0, 100)
-        b = rng.randint(0, 100)
-        task = Task(
-            seed=seed,
-            operand_a=a,
-            operand_b=b,
-            operator="+",
-            correct_answer=a + b,
-            reward=1.0,
+    """Stream ``count`` tasks for ``seed`` into Postgres with COPY, in chunks."""
+    connection = await db.connection()
+    driver = (await connection.get_raw_connection()).driver_connection
+    generated = 0
+    async with driver.transaction():
+        for rows in iter_task_rows(seed, count):
+            await driver.copy_records_to_table(
+                Task.__tablename__, records=rows, columns=COPY_COLUMNS
+            )
+            generated += len(rows)
+    return generated
+
+
+async def get_next_task(
+    db: AsyncSession,
+    individual_id: str | None = None,
+    count: int = 1,
+    lease_seconds: int = LEASE_SECONDS,
+    procedural: bool = True,
+) -> list[Task]:
+    """
+    Lease up to ``count`` of the oldest pending tasks to ``individual_id``.
+
+    Candidate rows are locked with SKIP LOCKED, so concurrent callers never
+    wait on each other and never receive the same task. When stored tasks run
+    out, the remainder is taken from stateless procedural streams unless
+    ``procedural`` is false.
+    """
+    claimable = (
+        select(Task.id)
+        .where(Task.status == "pending")
+        .order_by(Task.created_at)
+        .limit(count)
+        .with_for_update(skip_locked=True)
+    )
+    result = await db.execute(
+        update(Task)
+        .where(Task.id.in_(claimable.scalar_subquery()))
+        .values(
+            status="leased",
+            leased_by=individual_id,
+            lease_expires_at=datetime.utcnow() + timedelta(seconds=lease_seconds),
         )
-        tasks.append(task)
-    db.add_all(tasks)
+        .returning(Task)
+        .execution_options(synchronize_session=False)
+    )
+    tasks = sorted(result.scalars().all(), key=lambda task: task.created_at)
+    if procedural and len(tasks) < count:
+        tasks += await procedural_tasks.claim(db, count - len(tasks))
     await db.commit()
-    return len(tasks)
+    return tasks
 
 
-async def get_next_task(db: AsyncSession) -> Task | None:
+async def release_expired_leases(db: AsyncSession, batch_size: int) -> int:
+    """Return up to ``batch_size`` expired leases to the pending pool."""
+    expired = (
+        select(Task.id)
+        .where(Task.status == "leased", Task.lease_expires_at < datetime.utcnow())
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
     result = await db.execute(
-        select(Task)
-        .where(Task.status == "pending")
-        .order_by(Task.created_at)
-        .limit(1)
+        update(Task)
+        .where(Task.id.in_(expired.scalar_subquery()))
+        .values(status="pending", leased_by=None, lease_expires_at=None)
+        .execution_options(synchronize_session=False)
     )
-    return result.scalar_one_or_none()
+    await db.commit()
+    return result.rowcount
 
 
-async def submit_answer(
-    db: AsyncSession, task_id: UUID, answer: int
-) -> tuple[bool, float, int]:
-    result = await db.execute(select(Task).where(Task.id == task_id))
-    task = result.scalar_one_or_none()
-    if task is None:
-        raise ValueError(f"Task {task_id} not found")
+async def extend_leases(
+    db: AsyncSession, task_ids: list[UUID], owner: str, lease_seconds: int
+) -> dict[UUID, datetime]:
+    """
+    Restart the lease of tasks still leased by ``owner``; returns the new
+    deadline by task id. Tasks whose lease was lost are left out.
+    """
+    expires_at = datetime.utcnow() + timedelta(seconds=lease_seconds)
+    result = await db.execute(
+        update(Task)
+        .where(
+            Task.id.in_(task_ids), Task.status == "leased", Task.leased_by == owner
+        )
+        .values(lease_expires_at=expires_at)
+        .returning(Task.id)
+        .execution_options(synchronize_session=False)
+    )
+    renewed = {task_id: expires_at for task_id in result.scalars()}
+    await db.commit()
+    return renewed
 
-    correct = answer == task.correct_answer
-    task.submitted_answer = answer
-    task.status = "completed" if correct else "failed"
-    task.solved_at = datetime.utcnow()
+
+async def hand_over_leases(
+    db: AsyncSession, leases: list[tuple[UUID, str | None, datetime]], owner: str
+) -> int:
+    """
+    Move (task id, holder, deadline) leases still held by ``owner`` to
+    their new holders in one UPDATE joined against a VALUES list.
+    """
+    handed = values(
+        column("id", PG_UUID(as_uuid=True)),
+        column("leased_by", String(64)),
+        column("lease_expires_at", DateTime),
+        name="handed",
+    ).data(leases)
+    result = await db.execute(
+        update(Task)
+        .where(Task.id == handed.c.id, Task.status == "leased", Task.leased_by == owner)
+        .values(leased_by=handed.c.leased_by, lease_expires_at=handed.c.lease_expires_at)
+        .execution_options(synchronize_session=False)
+    )
     await db.commit()
-    return correct, task.reward if correct else 0.0, task.correct_answer
+    return result.rowcount
 
 
-async def get_stats(db: AsyncSession) -> dict:
-    total = await db.execute(select(func.count(Task.id)))
-    pending = await db.execute(
-        select(func.count(Task.id)).where(Task.status == "pending")
+async def release_leases(db: AsyncSession, task_ids: list[UUID], owner: str) -> int:
+    """Return tasks still leased by ``owner`` to the pending pool."""
+    result = await db.execute(
+        update(Task)
+        .where(
+            Task.id.in_(task_ids), Task.status == "leased", Task.leased_by == owner
+        )
+        .values(status="pending", leased_by=None, lease_expires_at=None)
+        .execution_options(synchronize_session=False)
     )
-    completed = await db.execute(
-        select(func.count(Task.id)).where(Task.status == "completed")
+    await db.commit()
+    return result.rowcount
+
+
+def _graded(row) -> GradeResult:
+    """Build a GradeResult from a row returned by a grading UPDATE."""
+    correct = row.status == "completed"
+    return GradeResult(correct, row.reward if correct else 0.0, row.correct_answer)
+
+
+async def _recorded(db: AsyncSession, task_ids) -> dict[UUID, GradeResult]:
+    """
+    Outcomes recorded for tasks graded earlier, reported as already graded
+    with no reward. Unknown ids are left out.
+    """
+    result = await db.execute(
+        select(Task.id, Task.status, Task.correct_answer).where(Task.id.in_(task_ids))
     )
-    failed = await db.execute(
-        select(func.count(Task.id)).where(Task.status == "failed")
+    return {
+        task_id: GradeResult(status == "completed", 0.0, correct_answer, True)
+        for task_id, status, correct_answer in result
+    }
+
+
+async def _record_procedural(
+    db: AsyncSession, answers: dict[UUID, int]
+) -> dict[UUID, GradeResult]:
+    """
+    Grade procedural task answers by inserting their first and only row.
+
+    The correct answer is regenerated from the task id; a conflicting insert
+    means the task was graded before, and its recorded outcome is reported.
+    """
+    keys = {task_id: procedural_tasks.decode_task_id(task_id) for task_id in answers}
+    issued = await procedural_tasks.issued(db, list(keys.values()))
+    for task_id, key in keys.items():
+        # A valid tag alone is not enough: the index must have been claimed
+        if key not in issued:
+            raise ValueError(f"Task {task_id} not found")
+    now = datetime.utcnow()
+    rows = []
+    for task_id, answer in answers.items():
+        task = procedural_tasks.build_task(*keys[task_id])
+        correct = answer == task.correct_answer
+        rows.append(
+            {
+                "id": task_id,
+                "seed": task.seed,
+                "operand_a": task.operand_a,
+                "operand_b": task.operand_b,
+                "operator": task.operator,
+                "correct_answer": task.correct_answer,
+                "submitted_answer": answer,
+                "reward": task.reward,
+                "status": "completed" if correct else "failed",
+                "created_at": now,
+                "solved_at": now,
+            }
+        )
+    result = await db.execute(
+        insert(Task)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=[Task.id])
+        .returning(Task.id, Task.status, Task.reward, Task.correct_answer)
     )
+    graded = {row.id: _graded(row) for row in result.all()}
+    earlier = answers.keys() - graded.keys()
+    if earlier:
+        graded.update(await _recorded(db, earlier))
+    return graded
+
+
+async def submit_answer(db: AsyncSession, task_id: UUID, answer: int) -> GradeResult:
+    """
+    Grade ``answer`` with a single conditional UPDATE ... RETURNING.
+
+    Only pending or leased tasks are graded. A task that was answered before
+    is reported as already graded, with its recorded outcome and no reward,
+    and left untouched.
+    """
+    if procedural_tasks.decode_task_id(task_id) is not None:
+        graded = await _record_procedural(db, {task_id: answer})
+        await db.commit()
+        return graded[task_id]
+
+    result = await db.execute(
+        update(Task)
+        .where(Task.id == task_id, Task.status.in_(OPEN_STATUSES))
+        .values(
+            submitted_answer=answer,
+            status=case((Task.correct_answer == answer, "completed"), else_="failed"),
+            solved_at=datetime.utcnow(),
+        )
+        .returning(Task.status, Task.reward, Task.correct_answer)
+        .execution_options(synchronize_session=False)
+    )
+    graded = result.one_or_none()
+    await db.commit()
+    if graded is not None:
+        return _graded(graded)
+
+    # Cold path: tell an unknown task apart from one graded earlier
+    recorded = await _recorded(db, [task_id])
+    if task_id not in recorded:
+        raise ValueError(f"Task {task_id} not found")
+    return recorded[task_id]
+
+
+async def _grade_stored(
+    db: AsyncSession, answers: dict[UUID, int]
+) -> dict[UUID, GradeResult]:
+    """Grade stored tasks in one UPDATE joined against a VALUES list."""
+    submitted = values(
+        column("id", PG_UUID(as_uuid=True)),
+        column("answer", Integer),
+        name="submitted",
+    ).data(list(answers.items()))
+    result = await db.execute(
+        update(Task)
+        .where(Task.id == submitted.c.id, Task.status.in_(OPEN_STATUSES))
+        .values(
+            submitted_answer=submitted.c.answer,
+            status=case(
+                (Task.correct_answer == submitted.c.answer, "completed"),
+                else_="failed",
+            ),
+            solved_at=datetime.utcnow(),
+        )
+        .returning(Task.id, Task.status, Task.reward, Task.correct_answer)
+        .execution_options(synchronize_session=False)
+    )
+    graded = {row.id: _graded(row) for row in result.all()}
+
+    missing = answers.keys() - graded.keys()
+    if missing:
+        graded.update(await _recorded(db, missing))
+        unknown = missing - graded.keys()
+        if unknown:
+            raise ValueError(f"Task {unknown.pop()} not found")
+    return graded
+
+
+async def submit_answers(
+    db: AsyncSession, answers: list[tuple[UUID, int]]
+) -> list[GradeResult]:
+    """
+    Grade a batch of answers in one transaction.
+
+    Results follow the order of ``answers``. Only the first answer given for
+    a task counts; repeats and tasks graded earlier are reported as already
+    graded with the recorded outcome. The batch is
+    rolled back as a whole if any task id is unknown.
+    """
+    procedural: dict[UUID, int] = {}
+    stored: dict[UUID, int] = {}
+    for task_id, answer in answers:
+        if procedural_tasks.decode_task_id(task_id) is not None:
+            procedural.setdefault(task_id, answer)
+        else:
+            stored.setdefault(task_id, answer)
+
+    graded: dict[UUID, GradeResult] = {}
+    try:
+        if procedural:
+            graded.update(await _record_procedural(db, procedural))
+        if stored:
+            graded.update(await _grade_stored(db, stored))
+    except ValueError:
+        await db.rollback()
+        raise
+    await db.commit()
+
+    recorded = {
+        task_id: r._replace(reward=0.0, already_graded=True)
+        for task_id, r in graded.items()
+    }
+    results = []
+    for task_id, _ in answers:
+        # A repeated id within the batch reports what its first answer recorded
+        result = graded.pop(task_id, None)
+        results.append(recorded[task_id] if result is None else result)
+    return results
+
+
+async def count_tasks(db: AsyncSession) -> dict:
+    """Exact task statistics from one aggregate scan of the tasks table."""
+    result = await db.execute(
+        select(
+            func.count().label("total"),
+            *(
+                func.count().filter(Task.status == status).label(status)
+                for status in STAT_STATUSES
+            ),
+        )
+    )
+    return dict(result.one()._mapping)
+
+
+async def get_stats(db: AsyncSession) -> dict:
+    """Task statistics from the trigger-maintained counters, O(1) in tasks."""
+    result = await db.execute(
+        select(TaskCounter.status, func.sum(TaskCounter.n)).group_by(
+            TaskCounter.status
+        )
+    )
+    counts = {status: int(n) for status, n in result}
     return {
-        "total": total.scalar() or 0,
-        "pending": pending.scalar() or 0,
-        "completed": completed.scalar() or 0,
-        "failed": failed.scalar() or 0,
+        "total": sum(counts.values()),
+        **{status: counts.get(status, 0) for status in STAT_STATUSES},
     }
+
+
+async def reconcile_stats(db: AsyncSession) -> tuple[dict, dict]:
+    """
+    Reset the counters to an exact count of the tasks table.
+
+    Writers to tasks are blocked (SHARE lock) while the table is counted, so
+    the rebuilt counters match it exactly. Returns the counter-based and the
+    actual statistics as they were before the reset.
+    """
+    await db.execute(text("LOCK TABLE tasks IN SHARE MODE"))
+    counted = await get_stats(db)
+    actual = await count_tasks(db)
+    await db.execute(delete(TaskCounter))
+    await db.execute(
+        insert(TaskCounter).values(
+            [
+                {"status": status, "stripe": 0, "n": actual[status]}
+                for status in STAT_STATUSES
+            ]
+        )
+    )
+    await db.commit()
+    return counted, actual
@@ -0,0 +1,5 @@
+"""In-process state shared by routes and background workers."""
+
+from state import candidates, population, staleness, task_delivery
+
+__all__ = ["candidates", "population", "staleness", "task_delivery"]
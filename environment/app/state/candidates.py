@@ -0,0 +1,77 @@
+"""
+In-memory ranking of sacrifice candidates.
+
+A min-heap over alive individuals in the order a sacrifice takes them:
+stale individuals first, longest silent first, then by energy key, which
+orders individuals by current energy at any time. The population registry
+files a key on every change and the staleness wheel re-files individuals
+as they go stale. Superseded heap entries are left in place and skipped
+when popped (lazy deletion); the heap is rebuilt once they dominate it.
+"""
+
+import heapq
+
+# Rebuild the heap once it holds this many entries per live key
+COMPACT_RATIO = 2
+COMPACT_MIN = 1024
+
+
+class CandidateIndex:
+    """Alive individual ids keyed by (stale rank, deadline or energy key)."""
+
+    def __init__(self):
+        self._heap: list[tuple[int, float, str]] = []
+        self._keys: dict[str, tuple[int, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _push(self, individual_id: str, key: tuple[int, float]) -> None:
+        if self._keys.get(individual_id) == key:
+            return
+        self._keys[individual_id] = key
+        heapq.heappush(self._heap, (*key, individual_id))
+        if len(self._heap) > max(COMPACT_MIN, COMPACT_RATIO * len(self._keys)):
+            self._heap = [(*key, i) for i, key in self._keys.items()]
+            heapq.heapify(self._heap)
+
+    def update(self, individual_id: str, energy_key: float) -> None:
+        """File an alive, not stale individual by its energy key."""
+        self._push(individual_id, (1, energy_key))
+
+    def mark_stale(self, individual_id: str, deadline: float) -> None:
+        """Move a tracked individual ahead of every live one."""
+        if individual_id in self._keys:
+            self._push(individual_id, (0, deadline))
+
+    def remove(self, individual_id: str) -> None:
+        self._keys.pop(individual_id, None)
+
+    def clear(self) -> None:
+        self._heap.clear()
+        self._keys.clear()
+
+    def is_stale(self, individual_id: str) -> bool:
+        key = self._keys.get(individual_id)
+        return key is not None and key[0] == 0
+
+    def bottom(self, count: int) -> list[str]:
+        """
+        The ``count`` first candidates, next victim first, in
+        O(count log n): valid entries are popped and pushed back, superseded
+        ones are dropped for good.
+        """
+        ranked: list[tuple[int, float, str]] = []
+        seen: set[str] = set()
+        while self._heap and len(ranked) < count:
+            entry = heapq.heappop(self._heap)
+            # An id re-filed under an earlier key can hold two valid entries
+            if self._keys.get(entry[2]) == entry[:2] and entry[2] not in seen:
+                seen.add(entry[2])
+                ranked.append(entry)
+        for entry in ranked:
+            heapq.heappush(self._heap, entry)
+        return [entry[2] for entry in ranked]
+
+
+index = CandidateIndex()
@@ -0,0 +1,459 @@
+"""
+Authoritative in-process registry of individuals.
+
+Every individual is loaded into a compact record at startup and reads are
+answered from memory. Registrations and sacrifices are written through
+before they are applied; heartbeats only change the records and mark them
+dirty, and a background loop persists the dirty set every
+HEARTBEAT_FLUSH_MS as one multi-row upsert (HEARTBEAT_FLUSH_MS=0 writes
+each heartbeat through), together with every beat since the last flush
+for the heartbeat history. The app flushes on shutdown and reloads from the
+individuals table on the next start.
+
+A single API process owns the population by default. When the API is
+scaled out, set REGISTRY_FOLLOW_MS: every process then keeps its own
+registry and follows the individuals change feed at that period, so kills,
+registrations and heartbeats written by other processes reach it, and a
+heartbeat for an id it has not seen yet is looked up in the table. Rows
+are applied only if their change version is newer than the record's, and
+heartbeat fields only if the row's heartbeat is newer.
+"""
+
+import asyncio
+import bisect
+import contextlib
+import logging
+import os
+import uuid
+from collections.abc import AsyncIterator, Iterator
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import asyncpg
+from db import Individual, async_session
+from services import heartbeat_history, individual_service
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+from state import candidates, staleness
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_FLUSH_MS = int(os.getenv("HEARTBEAT_FLUSH_MS", "200"))
+HEARTBEAT_HISTORY = os.getenv("HEARTBEAT_HISTORY", "1") == "1"
+# Unwritten history samples kept while the database is unreachable
+HISTORY_BUFFER_MAX = int(os.getenv("HEARTBEAT_HISTORY_BUFFER_MAX", "100000"))
+# Off for a single process, whose own writes would only be read back
+REGISTRY_FOLLOW_MS = int(os.getenv("REGISTRY_FOLLOW_MS", "0"))
+
+
+class IndividualRecord:
+    """In-memory state of one individual."""
+
+    __slots__ = (
+        "id",
+        "name",
+        "body_url",
+        "registered_at",
+        "last_heartbeat",
+        "energy",
+        "age",
+        "tasks_solved",
+        "alive",
+        "state_at",
+        "version",
+        "revision",
+    )
+
+    def __init__(self, individual: Individual, revision: int):
+        self.id = individual.id
+        self.name = individual.name
+        self.body_url = individual.body_url
+        self.registered_at = individual.registered_at
+        self.last_heartbeat = individual.last_heartbeat
+        self.energy = individual.energy
+        self.age = individual.age
+        self.tasks_solved = individual.tasks_solved
+        self.alive = individual.alive
+        self.state_at = individual.state_at
+        self.version = individual.version
+        self.revision = revision
+
+
+@dataclass
+class RegistryStats:
+    """Counters of the registry and its write-behind flush."""
+
+    loaded_at: datetime | None = None
+    flushes: int = 0
+    flushed_total: int = 0
+    flush_errors: int = 0
+    last_flush_at: datetime | None = None
+    history_recorded: int = 0
+    history_dropped: int = 0
+    followed_total: int = 0
+    follow_errors: int = 0
+
+
+class PopulationRegistry:
+    """Individuals by id, plus a (name, id) order for keyset listing."""
+
+    def __init__(self, flush_ms: int, history: bool, follow_ms: int = 0):
+        self.flush_ms = flush_ms
+        self.history = history
+        self.follow_ms = follow_ms
+        # Changes on every load, so ETags never survive a restart or reload
+        self.epoch = uuid.uuid4().hex[:8]
+        self.revision = 0
+        # Highest change version read from the individuals change feed
+        self.cursor = 0
+        self.stats = RegistryStats()
+        self._records: dict[str, IndividualRecord] = {}
+        self._order: list[tuple[str, str]] = []
+        self._dirty: dict[str, IndividualRecord] = {}
+        # Every beat, not just the latest per id, for the heartbeat history
+        self._samples: list[tuple] = []
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    @property
+    def dirty(self) -> int:
+        return len(self._dirty)
+
+    def _touch(self, record: IndividualRecord) -> None:
+        self.revision += 1
+        record.revision = self.revision
+
+    def _schedule(self, record: IndividualRecord) -> None:
+        """
+        File the record's next heartbeat deadline and sacrifice rank, or drop
+        both if it is dead.
+        """
+        if record.alive:
+            at = record.last_heartbeat.replace(tzinfo=timezone.utc).timestamp()
+            staleness.wheel.beat(record.id, at)
+            candidates.index.update(
+                record.id, individual_service.energy_key(record.energy, record.state_at)
+            )
+        else:
+            staleness.wheel.remove(record.id)
+            candidates.index.remove(record.id)
+
+    async def load(self) -> int:
+        """
+        Replace the registry with the contents of the individuals table.
+
+        Records changed in memory while the table was being read are newer
+        than the rows and are kept (and left dirty).
+        """
+        since = self.revision
+        async with async_session() as db:
+            result = await db.execute(select(Individual))
+            individuals = list(result.scalars().all())
+        records = {i.id: IndividualRecord(i, self.revision) for i in individuals}
+        dirty = {}
+        for record in self._records.values():
+            if record.revision > since:
+                records[record.id] = dirty[record.id] = record
+        self.epoch = uuid.uuid4().hex[:8]
+        self.cursor = max((i.version for i in individuals), default=self.cursor)
+        self._records = records
+        self._order = sorted((r.name, r.id) for r in records.values())
+        self._dirty = dirty
+        staleness.wheel.clear()
+        candidates.index.clear()
+        for record in records.values():
+            self._schedule(record)
+        self.stats.loaded_at = datetime.utcnow()
+        return len(records)
+
+    async def reload(self) -> int:
+        """Persist pending heartbeats, then reload from the database."""
+        async with self.synced():
+            return await self.load()
+
+    @contextlib.asynccontextmanager
+    async def synced(self) -> AsyncIterator[None]:
+        """
+        Write every dirty record, then hold off other flushes.
+
+        Used around writes that must not be overwritten by an older
+        in-flight flush, such as a sacrifice.
+        """
+        async with self._lock:
+            await self._write_dirty()
+            yield
+
+    def get(self, individual_id: str) -> IndividualRecord | None:
+        return self._records.get(individual_id)
+
+    def store(self, individuals: list[Individual]) -> list[IndividualRecord]:
+        """
+        Apply individuals just written by a registration.
+
+        Heartbeat fields of known records are kept: memory is either equal
+        to the row or holds a newer, not yet flushed heartbeat.
+        """
+        records = []
+        for individual in individuals:
+            record = self._records.get(individual.id)
+            if record is None:
+                record = IndividualRecord(individual, 0)
+                self._records[record.id] = record
+                bisect.insort(self._order, (record.name, record.id))
+            else:
+                if not record.alive:
+                    # Revived: decay restarts from the row's state
+                    record.energy = individual.energy
+                    record.age = individual.age
+                    record.state_at = individual.state_at
+                record.body_url = individual.body_url
+                record.last_heartbeat = individual.last_heartbeat
+                record.alive = individual.alive
+                record.version = max(record.version, individual.version)
+            self._touch(record)
+            self._schedule(record)
+            records.append(record)
+        return records
+
+    def kill(self, individual: Individual) -> None:
+        """
+        Apply a sacrifice that was just written, including the energy and
+        age frozen at death. Any pending heartbeat for it is dropped.
+        """
+        record = self._records.get(individual.id)
+        if record is not None:
+            record.energy = individual.energy
+            record.age = individual.age
+            record.state_at = individual.state_at
+            record.alive = False
+            record.version = max(record.version, individual.version)
+            self._dirty.pop(individual.id, None)
+            self._touch(record)
+            self._schedule(record)
+
+    def _apply(self, individuals: list[Individual]) -> int:
+        """
+        Apply rows read back from the table, possibly written by another
+        process; returns how many records changed. A row's state is taken
+        only if its heartbeat or sacrifice is newer than the record's last
+        heartbeat, or if it revives the record, so unflushed local beats
+        survive.
+        """
+        changed = 0
+        for individual in individuals:
+            record = self._records.get(individual.id)
+            if record is None:
+                record = IndividualRecord(individual, 0)
+                self._records[record.id] = record
+                bisect.insort(self._order, (record.name, record.id))
+            elif individual.version <= record.version:
+                continue
+            else:
+                record.version = individual.version
+                at = individual.last_heartbeat
+                if not individual.alive and individual.sacrificed_at is not None:
+                    at = max(at, individual.sacrificed_at)
+                if not (at > record.last_heartbeat or (individual.alive and not record.alive)):
+                    continue
+                record.body_url = individual.body_url
+                record.last_heartbeat = individual.last_heartbeat
+                record.energy = individual.energy
+                record.age = individual.age
+                record.tasks_solved = individual.tasks_solved
+                record.alive = individual.alive
+                record.state_at = individual.state_at
+                self._dirty.pop(individual.id, None)
+            self._touch(record)
+            self._schedule(record)
+            changed += 1
+        return changed
+
+    async def _fetch(self, individual_ids: list[str]) -> None:
+        """Look up individuals this registry has not seen yet."""
+        async with async_session() as db:
+            result = await db.execute(
+                select(Individual).where(Individual.id.in_(individual_ids))
+            )
+            self._apply(list(result.scalars().all()))
+
+    async def follow(self) -> int:
+        """Apply every change since the last one read; returns records changed."""
+        changed = 0
+        async with async_session() as db:
+            has_more = True
+            while has_more:
+                individuals, cursor, has_more = await individual_service.get_changes(
+                    db, self.cursor
+                )
+                changed += self._apply(individuals)
+                self.cursor = max(self.cursor, cursor)
+        self.stats.followed_total += changed
+        return changed
+
+    def _beat(
+        self,
+        record: IndividualRecord,
+        now: datetime,
+        energy: float,
+        age: int,
+        tasks_solved: int,
+        alive: bool,
+    ) -> None:
+        record.last_heartbeat = now
+        record.energy = energy
+        record.age = age
+        record.tasks_solved = tasks_solved
+        record.alive = alive
+        record.state_at = now
+        self._touch(record)
+        self._dirty[record.id] = record
+        self._schedule(record)
+        if self.history:
+            self._samples.append((record.id, now, energy, age, tasks_solved))
+
+    async def heartbeat(
+        self,
+        individual_id: str,
+        energy: float,
+        age: int,
+        tasks_solved: int,
+        alive: bool,
+    ) -> IndividualRecord | None:
+        """Apply a heartbeat in memory; None if the individual is unknown."""
+        record = self._records.get(individual_id)
+        if record is None and self.follow_ms > 0:
+            await self._fetch([individual_id])
+            record = self._records.get(individual_id)
+        if record is None:
+            return None
+        self._beat(record, datetime.utcnow(), energy, age, tasks_solved, alive)
+        if self.flush_ms <= 0:
+            await self.flush()
+        return record
+
+    async def apply_batch(
+        self, heartbeats: list[tuple[str, float, int, int, bool]]
+    ) -> list[str]:
+        """Apply many heartbeats in memory; returns the ids not registered."""
+        missing = [i for i, *_ in heartbeats if i not in self._records]
+        if missing and self.follow_ms > 0:
+            await self._fetch(list(set(missing)))
+        now = datetime.utcnow()
+        unknown = []
+        for individual_id, energy, age, tasks_solved, alive in heartbeats:
+            record = self._records.get(individual_id)
+            if record is None:
+                unknown.append(individual_id)
+                continue
+            self._beat(record, now, energy, age, tasks_solved, alive)
+        if self.flush_ms <= 0:
+            await self.flush()
+        return list(dict.fromkeys(unknown))
+
+    def iter_records(
+        self,
+        after: tuple[str, str] | None = None,
+        alive: bool | None = None,
+        min_energy: float | None = None,
+        max_energy: float | None = None,
+        stale_since: datetime | None = None,
+    ) -> Iterator[IndividualRecord]:
+        """
+        Records in (name, id) order strictly after ``after``, filtered.
+        Energy bounds apply to current (decayed) energy.
+        """
+        now = datetime.utcnow()
+        order, key = self._order, after
+        index = 0 if key is None else bisect.bisect_right(order, key)
+        while True:
+            # A registration or reload while suspended may shift the order
+            if order is not self._order or (index and order[index - 1] != key):
+                order = self._order
+                index = 0 if key is None else bisect.bisect_right(order, key)
+            if index >= len(order):
+                return
+            key = order[index]
+            index += 1
+            record = self._records[key[1]]
+            if alive is not None and record.alive is not alive:
+                continue
+            if min_energy is not None or max_energy is not None:
+                energy, _ = individual_service.decayed(record, now)
+                if min_energy is not None and energy < min_energy:
+                    continue
+                if max_energy is not None and energy > max_energy:
+                    continue
+            if stale_since is not None and record.last_heartbeat >= stale_since:
+                continue
+            yield record
+
+    async def flush(self) -> int:
+        """Write every dirty record in one upsert."""
+        async with self._lock:
+            return await self._write_dirty()
+
+    async def _write_dirty(self) -> int:
+        """
+        Upsert dirty records and append pending history samples in one
+        transaction. History is written in a savepoint so that a failing
+        sample batch is dropped rather than blocking the population.
+        """
+        if not self._dirty and not self._samples:
+            return 0
+        batch, self._dirty = self._dirty, {}
+        samples, self._samples = self._samples, []
+        try:
+            async with async_session() as db:
+                written = await individual_service.upsert_heartbeats(
+                    db, list(batch.values())
+                )
+                if samples:
+                    try:
+                        async with db.begin_nested():
+                            await heartbeat_history.record(db, samples)
+                        self.stats.history_recorded += len(samples)
+                    # COPY goes through the driver, whose errors are not wrapped
+                    except (SQLAlchemyError, asyncpg.PostgresError):
+                        self.stats.history_dropped += len(samples)
+                        logger.exception("Dropped heartbeat history samples")
+                await db.commit()
+        except Exception:
+            self.stats.flush_errors += 1
+            # Keep the batch for the next flush unless a newer beat replaced it
+            for individual_id, record in batch.items():
+                self._dirty.setdefault(individual_id, record)
+            self._samples[:0] = samples
+            overflow = len(self._samples) - HISTORY_BUFFER_MAX
+            if overflow > 0:
+                del self._samples[:overflow]
+                self.stats.history_dropped += overflow
+            raise
+        self.stats.flushes += 1
+        self.stats.flushed_total += written
+        self.stats.last_flush_at = datetime.utcnow()
+        return written
+
+    async def run(self) -> None:
+        """Flush dirty records every ``flush_ms`` until cancelled."""
+        while True:
+            await asyncio.sleep(self.flush_ms / 1000)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Population flush failed")
+
+    async def watch(self) -> None:
+        """Follow the change feed every ``follow_ms`` until cancelled."""
+        while True:
+            await asyncio.sleep(self.follow_ms / 1000)
+            try:
+                await self.follow()
+            except Exception:
+                self.stats.follow_errors += 1
+                logger.exception("Following the individuals change feed failed")
+
+
+registry = PopulationRegistry(HEARTBEAT_FLUSH_MS, HEARTBEAT_HISTORY, REGISTRY_FOLLOW_MS)
@@ -0,0 +1,103 @@
+"""
+Hashed timing wheel of heartbeat deadlines.
+
+Each alive individual has one deadline, ``STALE_AFTER_SECONDS`` after its
+last heartbeat, filed in the wheel slot of the tick it falls in. A beat
+files a new deadline in O(1) and leaves the old entry to be discarded when
+its slot comes round; a background loop advances the wheel once per tick
+and marks individuals whose deadline passed as stale, also in the
+sacrifice candidate index.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+from state import candidates
+
+logger = logging.getLogger(__name__)
+
+STALE_AFTER_SECONDS = float(os.getenv("STALE_AFTER_SECONDS", "300"))
+STALE_TICK_SECONDS = float(os.getenv("STALE_TICK_SECONDS", "1"))
+WHEEL_SLOTS = 1024
+
+
+class DeadlineWheel:
+    """Heartbeat deadlines per individual and the set of those that passed."""
+
+    def __init__(self, stale_after: float, tick: float, slots: int = WHEEL_SLOTS):
+        self.stale_after = stale_after
+        self.tick = tick
+        self._slots: list[set[str]] = [set() for _ in range(slots)]
+        self._deadlines: dict[str, float] = {}
+        self._stale: dict[str, float] = {}
+        # Last tick processed by advance()
+        self._current = int(time.time() / tick) - 1
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def _tick_of(self, deadline: float) -> int:
+        return int(deadline / self.tick)
+
+    def beat(self, individual_id: str, at: float) -> None:
+        """Push the individual's deadline to ``at`` + stale_after."""
+        deadline = at + self.stale_after
+        self._deadlines[individual_id] = deadline
+        self._stale.pop(individual_id, None)
+        tick = max(self._tick_of(deadline), self._current + 1)
+        self._slots[tick % len(self._slots)].add(individual_id)
+
+    def remove(self, individual_id: str) -> None:
+        """Stop tracking an individual (e.g. once it is dead)."""
+        self._deadlines.pop(individual_id, None)
+        self._stale.pop(individual_id, None)
+
+    def clear(self) -> None:
+        for slot in self._slots:
+            slot.clear()
+        self._deadlines.clear()
+        self._stale.clear()
+
+    def advance(self, now: float) -> list[str]:
+        """Process every tick up to ``now``; returns ids that just went stale."""
+        size = len(self._slots)
+        # Only ticks that have fully elapsed, so every deadline in them passed
+        target = self._tick_of(now) - 1
+        expired = []
+        # After a long pause one pass over the wheel covers every slot
+        first = max(self._current + 1, target - size + 1)
+        for tick in range(first, target + 1):
+            slot = self._slots[tick % size]
+            for individual_id in list(slot):
+                deadline = self._deadlines.get(individual_id)
+                if deadline is not None and deadline <= now:
+                    self._stale[individual_id] = deadline
+                    candidates.index.mark_stale(individual_id, deadline)
+                    expired.append(individual_id)
+                    slot.discard(individual_id)
+                elif deadline is None or self._tick_of(deadline) % size != tick % size:
+                    # Superseded by a later beat filed in another slot;
+                    # entries for a later round of this slot stay
+                    slot.discard(individual_id)
+        self._current = max(self._current, target)
+        return expired
+
+    def is_stale(self, individual_id: str) -> bool:
+        return individual_id in self._stale
+
+    def stale(self) -> dict[str, float]:
+        """Stale individual ids mapped to the time their deadline passed."""
+        return dict(self._stale)
+
+    async def run(self) -> None:
+        """Advance the wheel every tick until cancelled."""
+        while True:
+            await asyncio.sleep(self.tick)
+            expired = self.advance(time.time())
+            if expired:
+                logger.info(f"{len(expired)} individuals missed their heartbeat deadline")
+
+
+wheel = DeadlineWheel(STALE_AFTER_SECONDS, STALE_TICK_SECONDS)
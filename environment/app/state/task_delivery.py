@@ -0,0 +1,97 @@
+"""
+Push delivery of tasks to subscribed individuals.
+
+Each subscriber has a bounded number of in-flight tasks: tasks pushed to it
+that have not been answered yet. Submit endpoints settle tasks, freeing
+slots, and task producers signal when new work becomes available so idle
+subscribers wake up instead of polling the database. A task that is never
+answered here (abandoned, or answered through another API process) frees
+its slot once its lease has passed.
+"""
+
+import asyncio
+import contextlib
+from datetime import datetime, timedelta
+from uuid import UUID
+
+from services import task_service
+
+
+class Subscription:
+    """Flow-control state of one subscribed individual."""
+
+    def __init__(self, individual_id: str | None, max_in_flight: int):
+        self.individual_id = individual_id
+        self.max_in_flight = max_in_flight
+        # In-flight task ids mapped to when their lease ends
+        self.in_flight: dict[UUID, datetime] = {}
+        self._settled = asyncio.Event()
+
+    @property
+    def free_slots(self) -> int:
+        return self.max_in_flight - len(self.in_flight)
+
+    def release(self, task_id: UUID) -> None:
+        self.in_flight.pop(task_id, None)
+        self._settled.set()
+
+    async def wait_settled(self, timeout: float) -> None:
+        """Wait until one of the in-flight tasks is answered."""
+        self._settled.clear()
+        with contextlib.suppress(TimeoutError):
+            await asyncio.wait_for(self._settled.wait(), timeout)
+
+
+class TaskDeliveryHub:
+    """Tracks subscribers, their in-flight tasks and task availability."""
+
+    def __init__(self):
+        self._owners: dict[UUID, Subscription] = {}
+        self._available = asyncio.Event()
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Forget a subscriber; its leases are left to expire."""
+        for task_id in subscription.in_flight:
+            self._owners.pop(task_id, None)
+        subscription.in_flight.clear()
+
+    def track(self, subscription: Subscription, tasks: list) -> None:
+        """
+        Record tasks pushed to ``subscription`` with the end of their lease.
+        Procedural tasks carry no lease and are held for a regular one.
+        """
+        default = datetime.utcnow() + timedelta(seconds=task_service.LEASE_SECONDS)
+        for task in tasks:
+            subscription.in_flight[task.id] = task.lease_expires_at or default
+            self._owners[task.id] = subscription
+
+    def expire(self, subscription: Subscription) -> int:
+        """Free the slots of in-flight tasks whose lease has passed."""
+        now = datetime.utcnow()
+        expired = [
+            task_id for task_id, ends in subscription.in_flight.items() if ends <= now
+        ]
+        for task_id in expired:
+            self._owners.pop(task_id, None)
+            del subscription.in_flight[task_id]
+        return len(expired)
+
+    def settle(self, task_ids: list[UUID]) -> None:
+        """Free the slots of answered tasks."""
+        for task_id in task_ids:
+            subscription = self._owners.pop(task_id, None)
+            if subscription is not None:
+                subscription.release(task_id)
+
+    def notify_available(self) -> None:
+        """Wake every subscriber waiting for new tasks."""
+        self._available.set()
+        self._available = asyncio.Event()
+
+    async def wait_available(self, timeout: float) -> None:
+        """Wait for new tasks, or ``timeout`` to poll other workers' tasks."""
+        with contextlib.suppress(TimeoutError):
+            await asyncio.wait_for(self._available.wait(), timeout)
+
+
+hub = TaskDeliveryHub()
@@ -0,0 +1,5 @@
+"""Background workers for the Environment API."""
+
+from workers import heartbeat_rollup, lease_sweeper, selection_scheduler, task_prefetch
+
+__all__ = ["heartbeat_rollup", "lease_sweeper", "selection_scheduler", "task_prefetch"]
@@ -0,0 +1,79 @@
+"""
+Background maintenance of the heartbeat history: partitions, rollups, retention.
+
+Raw partitions are created on their own loop every
+HEARTBEAT_PARTITION_INTERVAL_SECONDS, so history flushes keep finding a
+partition for today even when rollups are off.
+"""
+
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime
+
+from db import async_session
+from services import heartbeat_history
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_INTERVAL_SECONDS = float(os.getenv("HEARTBEAT_ROLLUP_INTERVAL_SECONDS", "60"))
+PARTITION_INTERVAL_SECONDS = float(os.getenv("HEARTBEAT_PARTITION_INTERVAL_SECONDS", "3600"))
+
+
+@dataclass
+class RollupStats:
+    """Counters of the history maintenance loop."""
+
+    runs: int = 0
+    errors: int = 0
+    buckets_1m: int = 0
+    buckets_10m: int = 0
+    dropped_partitions: int = 0
+    last_run_at: datetime | None = None
+
+
+stats = RollupStats()
+
+
+async def prepare() -> None:
+    """Make sure raw partitions exist before the first heartbeat flush."""
+    async with async_session() as db:
+        await heartbeat_history.ensure_partitions(db, datetime.utcnow().date())
+
+
+async def run_once() -> None:
+    """Downsample, then apply retention."""
+    now = datetime.utcnow()
+    async with async_session() as db:
+        minutes, tens = await heartbeat_history.rollup(db, now)
+        dropped = await heartbeat_history.apply_retention(db, now)
+    stats.runs += 1
+    stats.buckets_1m += minutes
+    stats.buckets_10m += tens
+    stats.dropped_partitions += len(dropped)
+    stats.last_run_at = now
+    if dropped:
+        logger.info(f"Dropped expired heartbeat partitions: {', '.join(dropped)}")
+
+
+async def run(interval_seconds: float = ROLLUP_INTERVAL_SECONDS) -> None:
+    """Maintain the history every ``interval_seconds`` until cancelled."""
+    while True:
+        try:
+            await run_once()
+        except Exception:
+            stats.errors += 1
+            logger.exception("Heartbeat history maintenance failed")
+        await asyncio.sleep(interval_seconds)
+
+
+async def run_partitions(interval_seconds: float = PARTITION_INTERVAL_SECONDS) -> None:
+    """Create upcoming raw partitions every ``interval_seconds`` until cancelled."""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await prepare()
+        except Exception:
+            stats.errors += 1
+            logger.exception("Creating heartbeat history partitions failed")
@@ -0,0 +1,64 @@
+"""Background sweeper returning abandoned task leases to the pending pool."""
+
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime
+
+from db import async_session
+from services import task_service
+from state import task_delivery
+
+logger = logging.getLogger(__name__)
+
+SWEEP_INTERVAL_SECONDS = float(os.getenv("LEASE_SWEEP_INTERVAL_SECONDS", "5"))
+SWEEP_BATCH_SIZE = int(os.getenv("LEASE_SWEEP_BATCH_SIZE", "500"))
+
+
+@dataclass
+class SweeperStats:
+    """Counters exposed through /tasks/leases/stats."""
+
+    runs: int = 0
+    errors: int = 0
+    reclaimed_total: int = 0
+    last_reclaimed: int = 0
+    last_run_at: datetime | None = None
+
+
+stats = SweeperStats()
+
+
+async def sweep_once(batch_size: int = SWEEP_BATCH_SIZE) -> int:
+    """Release every expired lease, one batched UPDATE at a time."""
+    reclaimed = 0
+    async with async_session() as db:
+        while True:
+            released = await task_service.release_expired_leases(db, batch_size)
+            reclaimed += released
+            if released < batch_size:
+                break
+
+    stats.runs += 1
+    stats.reclaimed_total += reclaimed
+    stats.last_reclaimed = reclaimed
+    stats.last_run_at = datetime.utcnow()
+    if reclaimed:
+        task_delivery.hub.notify_available()
+        logger.info(f"Returned {reclaimed} expired task leases to the pool")
+    return reclaimed
+
+
+async def run(
+    interval_seconds: float = SWEEP_INTERVAL_SECONDS,
+    batch_size: int = SWEEP_BATCH_SIZE,
+) -> None:
+    """Sweep expired leases every ``interval_seconds`` until cancelled."""
+    while True:
+        try:
+            await sweep_once(batch_size)
+        except Exception:
+            stats.errors += 1
+            logger.exception("Lease sweep failed")
+        await asyncio.sleep(interval_seconds)
@@ -0,0 +1,195 @@
+"""
+Background selection scheduler.
+
+Runs a sacrifice selection every SELECTION_INTERVAL_SECONDS and culls back
+down whenever the alive population exceeds SELECTION_MAX_POPULATION
+(checked every SELECTION_POLL_SECONDS). Either trigger is off at 0.
+
+When the API is scaled out, only the process holding a session-level
+Postgres advisory lock selects. The lock lives on a dedicated connection;
+the other processes keep trying to take it, so leadership moves on as soon
+as the leader's connection goes away. The other registries learn of the
+leader's kills from the individuals change feed, which scaled-out
+deployments enable with REGISTRY_FOLLOW_MS (see state.population).
+"""
+
+import asyncio
+import contextlib
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from db import async_session, engine
+from services import sacrifice_service, selection
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncConnection
+from state import population, staleness
+
+logger = logging.getLogger(__name__)
+
+SELECTION_INTERVAL_SECONDS = float(os.getenv("SELECTION_INTERVAL_SECONDS", "0"))
+SELECTION_MAX_POPULATION = int(os.getenv("SELECTION_MAX_POPULATION", "0"))
+SELECTION_POLL_SECONDS = float(os.getenv("SELECTION_POLL_SECONDS", "5"))
+SELECTION_STRATEGY = os.getenv("SELECTION_STRATEGY", "truncation")
+SELECTION_COUNT = int(os.getenv("SELECTION_COUNT", "1"))
+SELECTION_FRACTION = (
+    float(os.environ["SELECTION_FRACTION"]) if os.getenv("SELECTION_FRACTION") else None
+)
+SELECTION_MIN_INDIVIDUALS = max(0, int(os.getenv("SELECTION_MIN_INDIVIDUALS", "2")))
+# Held for as long as a process leads; distinct from the per-kill lock
+LEADER_LOCK_KEY = 0x5E1EC7ED
+RECENT_RUNS = 50
+
+
+@dataclass
+class SelectionRun:
+    """One scheduled selection."""
+
+    started_at: datetime
+    trigger: str
+    duration_ms: float
+    victims: int
+
+
+@dataclass
+class SchedulerStats:
+    """Leadership and per-run counters exposed through /sacrifice/scheduler/stats."""
+
+    leader: bool = False
+    elections: int = 0
+    runs: int = 0
+    errors: int = 0
+    victims_total: int = 0
+    duration_total_ms: float = 0.0
+    last_run_at: datetime | None = None
+    recent: deque = field(default_factory=lambda: deque(maxlen=RECENT_RUNS))
+
+
+stats = SchedulerStats()
+
+
+def enabled() -> bool:
+    return SELECTION_INTERVAL_SECONDS > 0 or SELECTION_MAX_POPULATION > 0
+
+
+class LeaderLock:
+    """A session-level advisory lock held on its own connection."""
+
+    def __init__(self, key: int):
+        self.key = key
+        self._connection: AsyncConnection | None = None
+
+    async def acquire(self) -> bool:
+        """True if this process leads, taking the lock if it is free."""
+        if self._connection is not None:
+            try:
+                # The lock is held as long as its connection is alive
+                await self._connection.scalar(select(1))
+                return True
+            except Exception:
+                logger.warning("Lost the selection leader connection")
+                await self.release()
+        connection = await engine.connect()
+        try:
+            await connection.execution_options(isolation_level="AUTOCOMMIT")
+            acquired = await connection.scalar(select(func.pg_try_advisory_lock(self.key)))
+        except Exception:
+            await connection.close()
+            raise
+        if not acquired:
+            await connection.close()
+            return False
+        self._connection = connection
+        return True
+
+    async def release(self) -> None:
+        connection, self._connection = self._connection, None
+        if connection is None:
+            return
+        with contextlib.suppress(Exception):
+            await connection.scalar(select(func.pg_advisory_unlock(self.key)))
+        with contextlib.suppress(Exception):
+            await connection.close()
+
+
+leader = LeaderLock(LEADER_LOCK_KEY)
+
+
+async def run_once(trigger: str, excess: int = 0) -> int:
+    """
+    Run one selection and apply it to the registry; returns the number of
+    victims. ``excess`` individuals over the population threshold are culled
+    with the configured strategy, otherwise the configured count/fraction.
+    """
+    started_at = datetime.utcnow()
+    start = time.perf_counter()
+    async with population.registry.synced(), async_session() as db:
+        victims = await sacrifice_service.sacrifice(
+            db,
+            SELECTION_STRATEGY,
+            count=excess or SELECTION_COUNT,
+            fraction=None if excess else SELECTION_FRACTION,
+            min_individuals=SELECTION_MIN_INDIVIDUALS,
+            stale_threshold_minutes=staleness.STALE_AFTER_SECONDS / 60,
+        )
+        for victim in victims:
+            population.registry.kill(victim)
+    duration_ms = (time.perf_counter() - start) * 1000
+    stats.runs += 1
+    stats.victims_total += len(victims)
+    stats.duration_total_ms += duration_ms
+    stats.last_run_at = started_at
+    stats.recent.append(SelectionRun(started_at, trigger, duration_ms, len(victims)))
+    logger.info(
+        f"Scheduled selection ({trigger}) removed {len(victims)} individuals "
+        f"in {duration_ms:.1f} ms"
+    )
+    return len(victims)
+
+
+async def _tick(due: float) -> float:
+    """One scheduler step; returns when the next cadence run is due."""
+    leading = await leader.acquire()
+    if leading and not stats.leader:
+        stats.elections += 1
+        logger.info("Became the selection scheduler leader")
+        # A new leader waits a full interval rather than doubling up
+        # with a run its predecessor may just have made
+        due = time.monotonic() + SELECTION_INTERVAL_SECONDS
+    stats.leader = leading
+    if not leading:
+        return due
+    if SELECTION_MAX_POPULATION > 0:
+        async with async_session() as db:
+            alive = await sacrifice_service.count_alive(db)
+        if alive > SELECTION_MAX_POPULATION:
+            await run_once("population", alive - SELECTION_MAX_POPULATION)
+    if SELECTION_INTERVAL_SECONDS > 0 and time.monotonic() >= due:
+        due = time.monotonic() + SELECTION_INTERVAL_SECONDS
+        await run_once("interval")
+    return due
+
+
+async def run() -> None:
+    """Contend for leadership and run due selections until cancelled."""
+    if SELECTION_STRATEGY not in selection.STRATEGIES:
+        logger.error(f"Selection scheduler disabled: unknown strategy {SELECTION_STRATEGY}")
+        return
+    periods = [SELECTION_POLL_SECONDS] if SELECTION_MAX_POPULATION > 0 else []
+    if SELECTION_INTERVAL_SECONDS > 0:
+        periods.append(min(SELECTION_INTERVAL_SECONDS, SELECTION_POLL_SECONDS))
+    due = time.monotonic() + SELECTION_INTERVAL_SECONDS
+    try:
+        while True:
+            await asyncio.sleep(min(periods))
+            try:
+                due = await _tick(due)
+            except Exception:
+                stats.errors += 1
+                logger.exception("Scheduled selection failed")
+    finally:
+        stats.leader = False
+        await leader.release()
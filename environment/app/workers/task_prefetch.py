@@ -0,0 +1,203 @@
+"""
+In-process buffer of pre-leased tasks served by /tasks/next.
+
+The buffer leases tasks in large batches under its own owner id and hands
+them out from memory, refilling in the background once it drops below a
+low watermark. A task handed out is re-leased to the caller for a regular
+lease; those hand-overs are written in batches every
+TASK_PREFETCH_HANDOFF_MS. Buffered leases run TASK_PREFETCH_HOLD_SECONDS longer than a
+regular lease and are renewed in bulk once half of that is used up, so an
+idle buffer keeps its tasks and callers always get a full lease. A task
+whose buffered lease was lost anyway (e.g. the database was unreachable) is
+dropped.
+
+Only stored tasks are buffered. A procedural task has no lease to return:
+once claimed, its stream cursor has moved past it, so one still buffered at
+shutdown would be lost. /tasks/next claims those directly on a shortfall.
+"""
+
+import asyncio
+import contextlib
+import logging
+import os
+import socket
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from db import Task, async_session
+from services import task_service
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_SIZE = int(os.getenv("TASK_PREFETCH_SIZE", "200"))
+PREFETCH_REFILL_BATCH = int(os.getenv("TASK_PREFETCH_REFILL_BATCH", "100"))
+PREFETCH_LOW_WATERMARK = int(
+    os.getenv("TASK_PREFETCH_LOW_WATERMARK", str(PREFETCH_SIZE // 4))
+)
+PREFETCH_HOLD_SECONDS = int(os.getenv("TASK_PREFETCH_HOLD_SECONDS", "60"))
+PREFETCH_IDLE_SECONDS = float(os.getenv("TASK_PREFETCH_IDLE_SECONDS", "1"))
+PREFETCH_HANDOFF_MS = int(os.getenv("TASK_PREFETCH_HANDOFF_MS", "200"))
+# How often buffered leases are checked for renewal
+RENEW_CHECK_SECONDS = max(PREFETCH_HOLD_SECONDS / 4, PREFETCH_IDLE_SECONDS)
+OWNER = f"prefetch:{os.getpid()}:{socket.gethostname()}"[:64]
+
+
+@dataclass
+class PrefetchStats:
+    """Counters exposed through /tasks/prefetch/stats."""
+
+    served: int = 0
+    refills: int = 0
+    prefetched: int = 0
+    dropped: int = 0
+    released: int = 0
+    renewed: int = 0
+    handed_over: int = 0
+
+
+class TaskPrefetchBuffer:
+    """Refillable FIFO of tasks leased ahead of demand."""
+
+    def __init__(self, size: int, refill_batch: int, low_watermark: int):
+        self.size = size
+        self.refill_batch = refill_batch
+        self.low_watermark = low_watermark
+        self.stats = PrefetchStats()
+        self._tasks: deque[Task] = deque()
+        # (task id, holder, deadline) of tasks served but not yet re-leased
+        self._handoffs: list[tuple] = []
+        self._low = asyncio.Event()
+        self._low.set()
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def take(self, count: int, owner: str | None = None) -> list[Task]:
+        """
+        Pop up to ``count`` tasks that still hold a full lease and lease
+        them to ``owner``; the hand-over is written by ``run_handoffs``.
+        """
+        full_lease = datetime.utcnow() + timedelta(seconds=task_service.LEASE_SECONDS)
+        tasks = []
+        while self._tasks and len(tasks) < count:
+            task = self._tasks.popleft()
+            if task.lease_expires_at >= full_lease:
+                task.leased_by = owner
+                task.lease_expires_at = full_lease
+                self._handoffs.append((task.id, owner, full_lease))
+                tasks.append(task)
+            else:
+                self.stats.dropped += 1
+        if len(self._tasks) < self.low_watermark:
+            self._low.set()
+        self.stats.served += len(tasks)
+        return tasks
+
+    async def refill(self) -> int:
+        """Lease tasks until the buffer is full or the pool runs dry."""
+        added = 0
+        while len(self._tasks) < self.size:
+            async with async_session() as db:
+                tasks = await task_service.get_next_task(
+                    db,
+                    OWNER,
+                    min(self.refill_batch, self.size - len(self._tasks)),
+                    task_service.LEASE_SECONDS + PREFETCH_HOLD_SECONDS,
+                    procedural=False,
+                )
+            if not tasks:
+                break
+            self._tasks.extend(tasks)
+            added += len(tasks)
+        self.stats.refills += 1
+        self.stats.prefetched += added
+        return added
+
+    async def renew(self) -> int:
+        """
+        Restart buffered leases with less than half of the hold left, in one
+        UPDATE, and drop the tasks whose lease was lost.
+        """
+        due = datetime.utcnow() + timedelta(
+            seconds=task_service.LEASE_SECONDS + PREFETCH_HOLD_SECONDS / 2
+        )
+        task_ids = [task.id for task in self._tasks if task.lease_expires_at < due]
+        if not task_ids:
+            return 0
+        async with async_session() as db:
+            renewed = await task_service.extend_leases(
+                db, task_ids, OWNER, task_service.LEASE_SECONDS + PREFETCH_HOLD_SECONDS
+            )
+        # Tasks taken while the UPDATE ran are no longer the buffer's to touch
+        lost = set(task_ids) - renewed.keys()
+        for task in self._tasks:
+            if task.id in renewed:
+                task.lease_expires_at = renewed[task.id]
+        if lost:
+            held = len(self._tasks)
+            self._tasks = deque(task for task in self._tasks if task.id not in lost)
+            self.stats.dropped += held - len(self._tasks)
+        self.stats.renewed += len(renewed)
+        return len(renewed)
+
+    async def run(self) -> None:
+        """
+        Refill whenever the buffer drops below its low watermark, and renew
+        buffered leases every RENEW_CHECK_SECONDS.
+        """
+        while True:
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._low.wait(), RENEW_CHECK_SECONDS)
+            try:
+                await self.renew()
+                if self._low.is_set():
+                    self._low.clear()
+                    if not await self.refill():
+                        await asyncio.sleep(PREFETCH_IDLE_SECONDS)
+            except Exception:
+                logger.exception("Task prefetch refill failed")
+                await asyncio.sleep(PREFETCH_IDLE_SECONDS)
+            if len(self._tasks) < self.low_watermark:
+                self._low.set()
+
+    async def hand_over(self) -> int:
+        """Write the pending hand-overs in one UPDATE."""
+        if not self._handoffs:
+            return 0
+        leases, self._handoffs = self._handoffs, []
+        try:
+            async with async_session() as db:
+                handed = await task_service.hand_over_leases(db, leases, OWNER)
+        except Exception:
+            self._handoffs[:0] = leases
+            raise
+        self.stats.handed_over += handed
+        return handed
+
+    async def run_handoffs(self) -> None:
+        """Write hand-overs every PREFETCH_HANDOFF_MS until cancelled."""
+        while True:
+            await asyncio.sleep(PREFETCH_HANDOFF_MS / 1000)
+            try:
+                await self.hand_over()
+            except Exception:
+                logger.exception("Writing prefetched task hand-overs failed")
+
+    async def release(self) -> int:
+        """Write pending hand-overs, then return buffered leases to the pool."""
+        await self.hand_over()
+        task_ids = [task.id for task in self._tasks]
+        self._tasks.clear()
+        if not task_ids:
+            return 0
+        async with async_session() as db:
+            released = await task_service.release_leases(db, task_ids, OWNER)
+        self.stats.released += released
+        logger.info(f"Released {released} prefetched task leases")
+        return released
+
+
+buffer = TaskPrefetchBuffer(
+    PREFETCH_SIZE, PREFETCH_REFILL_BATCH, PREFETCH_LOW_WATERMARK
+)
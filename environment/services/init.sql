@@ -1,3 +1,13 @@
+-- Schema of the environment database. Postgres runs this file on first
+-- start of an empty data volume. Every statement is idempotent, so the same
+-- file also upgrades an existing database in place; from this directory:
+--
+--   docker compose exec -T postgres psql -U postgres -d aidna \
+--       -v ON_ERROR_STOP=1 < init.sql
+--
+-- Columns added after a table was first created are repeated as
+-- ADD COLUMN IF NOT EXISTS below their CREATE TABLE for that purpose.
+
 CREATE TABLE IF NOT EXISTS tasks (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
     seed INTEGER NOT NULL,
@@ -8,12 +18,84 @@ CREATE TABLE IF NOT EXISTS tasks (
     submitted_answer INTEGER,
     reward FLOAT DEFAULT 1.0,
     status VARCHAR(20) DEFAULT 'pending',
+    leased_by VARCHAR(64),
+    lease_expires_at TIMESTAMP,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     solved_at TIMESTAMP
 );
 
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS leased_by VARCHAR(64);
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP;
+
 CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status);
 CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks(created_at);
+-- Claim queue for /tasks/next: oldest pending first
+CREATE INDEX IF NOT EXISTS idx_tasks_pending_created_at
+    ON tasks(created_at) WHERE status = 'pending';
+-- Lease sweeper: expired leases in deadline order
+CREATE INDEX IF NOT EXISTS idx_tasks_leased_expires_at
+    ON tasks(lease_expires_at) WHERE status = 'leased';
+
+-- Per-status task counters behind /tasks/stats, maintained by the statement
+-- triggers below. Each backend writes its own stripe so concurrent writers
+-- do not queue on one hot row; readers sum the stripes.
+CREATE TABLE IF NOT EXISTS task_counters (
+    status VARCHAR(20) NOT NULL,
+    stripe SMALLINT NOT NULL,
+    n BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (status, stripe)
+);
+
+CREATE OR REPLACE FUNCTION task_counters_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO task_counters (status, stripe, n)
+        SELECT status, pg_backend_pid() % 16, count(*) FROM new_rows GROUP BY status
+        ON CONFLICT (status, stripe) DO UPDATE SET n = task_counters.n + EXCLUDED.n;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO task_counters (status, stripe, n)
+        SELECT status, pg_backend_pid() % 16, -count(*) FROM old_rows GROUP BY status
+        ON CONFLICT (status, stripe) DO UPDATE SET n = task_counters.n + EXCLUDED.n;
+    ELSE
+        INSERT INTO task_counters (status, stripe, n)
+        SELECT status, pg_backend_pid() % 16, sum(delta)
+        FROM (
+            SELECT status, 1 AS delta FROM new_rows
+            UNION ALL
+            SELECT status, -1 AS delta FROM old_rows
+        ) changes
+        GROUP BY status
+        HAVING sum(delta) <> 0
+        ON CONFLICT (status, stripe) DO UPDATE SET n = task_counters.n + EXCLUDED.n;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER task_counters_insert
+    AFTER INSERT ON tasks REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION task_counters_apply();
+CREATE OR REPLACE TRIGGER task_counters_update
+    AFTER UPDATE ON tasks REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION task_counters_apply();
+CREATE OR REPLACE TRIGGER task_counters_delete
+    AFTER DELETE ON tasks REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION task_counters_apply();
+
+-- Tasks that predate the counters are counted once, while no stripe exists
+INSERT INTO task_counters (status, stripe, n)
+SELECT status, 0, count(*) FROM tasks
+WHERE NOT EXISTS (SELECT 1 FROM task_counters)
+GROUP BY status;
+
+-- Stateless task streams: tasks are derived from (seed, index) on demand and
+-- only written to tasks once answered
+CREATE TABLE IF NOT EXISTS task_streams (
+    seed INTEGER PRIMARY KEY,
+    total BIGINT NOT NULL,
+    next_index BIGINT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
 
 CREATE TABLE IF NOT EXISTS individuals (
     id VARCHAR(64) PRIMARY KEY,
@@ -24,8 +106,114 @@ CREATE TABLE IF NOT EXISTS individuals (
     energy FLOAT DEFAULT 100.0,
     age INTEGER DEFAULT 0,
     tasks_solved INTEGER DEFAULT 0,
-    alive BOOLEAN DEFAULT TRUE
+    alive BOOLEAN DEFAULT TRUE,
+    -- energy and age are base values as of state_at; current values decay
+    -- lazily. energy_key = energy + decay rate * epoch(state_at) orders
+    -- individuals by current energy at any time (kept by the app).
+    state_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    energy_key DOUBLE PRECISION NOT NULL DEFAULT 0,
+    version BIGINT NOT NULL DEFAULT 0,
+    -- Set when sacrificed (cause: stale, energy or the cull strategy),
+    -- cleared on revival
+    sacrificed_at TIMESTAMP,
+    cause VARCHAR(16)
 );
 
+ALTER TABLE individuals
+    ADD COLUMN IF NOT EXISTS state_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+-- Recomputed from energy and state_at by the app at startup
+ALTER TABLE individuals
+    ADD COLUMN IF NOT EXISTS energy_key DOUBLE PRECISION NOT NULL DEFAULT 0;
+ALTER TABLE individuals ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE individuals ADD COLUMN IF NOT EXISTS cause VARCHAR(16);
+-- Individuals that died before the sacrifice was recorded stay in the
+-- history, dated by their last heartbeat. Backfilled only by the upgrade
+-- that adds the column, so later deaths by heartbeat are not relabelled.
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema()
+            AND table_name = 'individuals' AND column_name = 'sacrificed_at'
+    ) THEN
+        ALTER TABLE individuals ADD COLUMN sacrificed_at TIMESTAMP;
+        UPDATE individuals SET sacrificed_at = last_heartbeat, cause = 'unknown'
+            WHERE NOT alive;
+    END IF;
+END $$;
+-- Heartbeat revivals used to leave the sacrifice in place
+UPDATE individuals SET sacrificed_at = NULL, cause = NULL
+    WHERE alive AND sacrificed_at IS NOT NULL;
+
 CREATE INDEX IF NOT EXISTS idx_individuals_alive ON individuals(alive);
 CREATE INDEX IF NOT EXISTS idx_individuals_energy ON individuals(energy);
+-- Alive individuals by current energy (sacrifice order)
+CREATE INDEX IF NOT EXISTS idx_individuals_alive_energy_key
+    ON individuals(energy_key) WHERE alive;
+-- Alive individuals by last heartbeat (stale-first sacrifice)
+CREATE INDEX IF NOT EXISTS idx_individuals_alive_last_heartbeat
+    ON individuals(last_heartbeat) WHERE alive;
+-- Keyset pagination of /individuals walks (name, id)
+CREATE INDEX IF NOT EXISTS idx_individuals_name_id ON individuals(name, id);
+-- Change feed behind /individuals/changes
+CREATE INDEX IF NOT EXISTS idx_individuals_version ON individuals(version);
+-- Sacrifice history, walked newest first
+CREATE INDEX IF NOT EXISTS idx_individuals_sacrificed_at
+    ON individuals(sacrificed_at, id) WHERE sacrificed_at IS NOT NULL;
+
+-- Every written row takes the next change version. Writers serialize on a
+-- transaction-scoped advisory lock taken before their first row, so versions
+-- become visible in commit order and a reader that has seen version N can
+-- never later find a newly committed row below N.
+CREATE SEQUENCE IF NOT EXISTS individuals_version_seq;
+
+CREATE OR REPLACE FUNCTION individuals_version_lock() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('individuals_version'));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION individuals_version_bump() RETURNS trigger AS $$
+BEGIN
+    NEW.version := nextval('individuals_version_seq');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER individuals_version_lock
+    BEFORE INSERT OR UPDATE ON individuals
+    FOR EACH STATEMENT EXECUTE FUNCTION individuals_version_lock();
+CREATE OR REPLACE TRIGGER individuals_version_bump
+    BEFORE INSERT OR UPDATE ON individuals
+    FOR EACH ROW EXECUTE FUNCTION individuals_version_bump();
+
+-- Heartbeat history: raw samples partitioned by day (partitions are created
+-- ahead and dropped after retention by the app), downsampled into 1 minute
+-- and 10 minute buckets
+CREATE TABLE IF NOT EXISTS heartbeat_history (
+    individual_id VARCHAR(64) NOT NULL,
+    ts TIMESTAMP NOT NULL,
+    energy REAL,
+    age INTEGER,
+    tasks_solved INTEGER
+) PARTITION BY RANGE (ts);
+
+CREATE INDEX IF NOT EXISTS idx_heartbeat_history_individual_ts
+    ON heartbeat_history(individual_id, ts);
+
+CREATE TABLE IF NOT EXISTS heartbeat_rollup_1m (
+    individual_id VARCHAR(64) NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    samples INTEGER NOT NULL,
+    energy_avg REAL,
+    energy_min REAL,
+    energy_max REAL,
+    age INTEGER,
+    tasks_solved INTEGER,
+    PRIMARY KEY (individual_id, bucket)
+);
+
+CREATE INDEX IF NOT EXISTS idx_heartbeat_rollup_1m_bucket ON heartbeat_rollup_1m(bucket);
+
+CREATE TABLE IF NOT EXISTS heartbeat_rollup_10m (LIKE heartbeat_rollup_1m INCLUDING ALL);